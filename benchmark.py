@@ -0,0 +1,476 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import logging
+import resource
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+import discord
+
+# Offline benchmark: drives main.on_message, main.send_scheduled_message and
+# sheets_utils.get_techtalk_message_if_today against local stand-ins (fake Discord gateway and
+# channels, a Gemini stub with configurable latency, a fixture spreadsheet) and reports
+# p50/p99 latency, throughput and peak memory.
+#
+#   python benchmark.py                              # 30 learners at 08:55, all scenarios
+#   python benchmark.py --learners 60 --gemini-latency 2 --max-p99 20
+#
+# Nothing leaves the machine: no Discord login, no Gemini key, no Google credentials.
+
+QUESTIONS = [
+    "How do I reverse a list in Python?",
+    "What is the difference between a list and a tuple?",
+    "Can you explain what a REST API is?",
+    "How does git rebase work?",
+    "What is a virtual environment for?",
+    "Why is my pandas merge creating duplicates?",
+    "What does async/await do in JavaScript?",
+    "How do I center a div?",
+]
+INTENT_QUESTIONS = ["what time is it?", "when is the next check-in?", "moodle link please", "how long until the break?"]
+TAG_PATTERN = re.compile(r"\(q\d+\)")
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+# --- Fake Discord ---------------------------------------------------------------------------
+
+class FakeRole:
+    def __init__(self, name):
+        self.name = name
+        self.mention = f"@{name}"
+
+
+class FakeGuild:
+    def __init__(self, roles):
+        self.roles = [FakeRole(name) for name in roles]
+
+
+class FakeUser:
+    def __init__(self, user_id, name, bot=False):
+        self.id = user_id
+        self.name = name
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+
+    def mentioned_in(self, message):
+        return self in message.mentions
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    _next_id = 1
+
+    def __init__(self, author, channel, content, mentions=()):
+        self.id = FakeMessage._next_id
+        FakeMessage._next_id += 1
+        self.author = author
+        self.channel = channel
+        self.content = content
+        self.mentions = list(mentions)
+
+    async def edit(self, content=None):
+        await self.channel.gateway.network_delay()
+        self.content = content
+        self.channel.gateway.delivered(self.channel, content)
+        return self
+
+    async def reply(self, content):
+        return await self.channel.send(content)
+
+
+class FakeChannel:
+    def __init__(self, gateway, channel_id, name, guild=None):
+        self.gateway = gateway
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.messages = 0
+
+    async def send(self, content):
+        await self.gateway.network_delay()
+        self.messages += 1
+        self.gateway.delivered(self, content)
+        return FakeMessage(self.gateway.user, self, content)
+
+
+class FakeGateway:
+    # Stands in for the Discord connection: owns the bot user and the channels,
+    # and records when each tagged answer or reminder becomes visible.
+
+    def __init__(self, bot, latency, jitter):
+        self.latency = latency
+        self.jitter = jitter
+        self.user = FakeUser(0, "BeCodeBot", bot=True)
+        self.channels = {}
+        self.answered = {}   # "(qN)" tag -> time the answer was first visible
+        self.reminders = []  # (channel_id, time)
+        self.api_calls = 0
+        bot._connection.user = self.user
+        bot.get_channel = self.channels.get
+        # Channels outside the cache (another shard's guilds) are sent to over REST
+        bot.get_partial_messageable = self.partial_channel
+        bot.fetch_channel = self.fetch_channel
+
+        async def no_commands(message):
+            return None
+        bot.process_commands = no_commands
+
+    def add_channel(self, channel_id, name, roles=()):
+        self.channels[channel_id] = FakeChannel(self, channel_id, name, FakeGuild(roles))
+        return self.channels[channel_id]
+
+    def partial_channel(self, channel_id, **kwargs):
+        return self.channels.get(channel_id) or FakeChannel(self, channel_id, f"channel-{channel_id}")
+
+    async def fetch_channel(self, channel_id):
+        await self.network_delay()
+        if channel_id not in self.channels:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Channel")
+        return self.channels[channel_id]
+
+    async def network_delay(self):
+        self.api_calls += 1
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+    def delivered(self, channel, content):
+        now = time.perf_counter()
+        for tag in TAG_PATTERN.findall(content or ""):
+            self.answered.setdefault(tag, now)
+        if "bip boup" in (content or ""):
+            self.reminders.append((channel.id, now))
+
+
+# --- Gemini stub ----------------------------------------------------------------------------
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubStream:
+    def __init__(self, chunks, first_delay, chunk_delay):
+        self._chunks = chunks
+        self._first_delay = first_delay
+        self._chunk_delay = chunk_delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for i, chunk in enumerate(self._chunks):
+            await asyncio.sleep(self._first_delay if i == 0 else self._chunk_delay)
+            yield StubResponse(chunk)
+
+
+class StubChat:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history or [])
+
+    async def send_message_async(self, prompt, stream=False):
+        self.model.calls += 1
+        tags = " ".join(TAG_PATTERN.findall(prompt))
+        reply = f"Good question! Here is a short answer, step by step. {'Lorem ipsum dolor sit amet. ' * 12}{tags}"
+        self.history += [{"role": "user", "parts": [prompt]}, {"role": "model", "parts": [reply]}]
+        total = self.model.latency()
+        if not stream:
+            await asyncio.sleep(total)
+            return StubResponse(reply)
+        size = max(1, len(reply) // self.model.chunks)
+        chunks = [reply[i:i + size] for i in range(0, len(reply), size)]
+        first = total * self.model.ttft_share
+        return StubStream(chunks, first, (total - first) / max(1, len(chunks) - 1))
+
+
+class StubGemini:
+    # Replaces both genai models: start_chat() for the learners, generate_content_async() for summaries
+    def __init__(self, latency, jitter, ttft_share=0.3, chunks=8):
+        self.mean = latency
+        self.jitter = jitter
+        self.ttft_share = ttft_share
+        self.chunks = chunks
+        self.calls = 0
+
+    def latency(self):
+        return max(0.05, random.gauss(self.mean, self.jitter))
+
+    def start_chat(self, history=None):
+        return StubChat(self, history)
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency())
+        return StubResponse("The learner asked several programming questions.")
+
+
+# --- Fixture spreadsheet --------------------------------------------------------------------
+
+class FixtureWorksheet:
+    def __init__(self, values, latency):
+        self._values = values
+        self._latency = latency
+
+    def get_all_values(self):
+        time.sleep(self._latency)
+        return self._values
+
+
+class FixtureSpreadsheet:
+    # Same shape as the real tech-talk sheet: a title row, then the headers, then one talk per row
+    def __init__(self, rows, latency):
+        today = datetime.now().date()
+        values = [["Tech-talks", "", "", "", "", ""], ["Date", "Learner", "Theme", "Voice", "Slides", "Body Language"]]
+        for i in range(rows):
+            day = today + timedelta(days=i - rows // 2)
+            values.append([day.strftime("%d/%m/%y"), f"Learner {i}", f"Theme {i}", "Good", "Clear", "Relaxed"])
+        self.sheet1 = FixtureWorksheet(values, latency)
+        self._latency = latency
+
+    def get_lastUpdateTime(self):
+        time.sleep(self._latency)
+        return "2025-01-01T00:00:00.000Z"
+
+
+# --- Harness --------------------------------------------------------------------------------
+
+def load_bot(args, workdir):
+    # main.py reads its configuration at import time; offline stand-ins for everything it needs
+    os.environ.setdefault("DISCORD_TOKEN", "offline")
+    os.environ.setdefault("GEMINI_API", "offline")
+    for name, value in (("CHANNEL_ID_AI", "1001"), ("CHANNEL_ID_WEBDEV", "1002"), ("CHANNEL_TEST_ID", "1003")):
+        os.environ.setdefault(name, value)
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name, filename in (("PERSONA_FILE", "persona.txt"), ("SCHEDULE_FILE", "schedule.json"), ("COHORTS_FILE", "cohorts.json"),
+                           ("EVENTS_FILE", "events.json")):
+        os.environ.setdefault(name, os.path.join(here, filename))
+    os.environ["CHAT_HISTORY_DB"] = os.path.join(workdir, "chat_history.db")
+    os.environ["METRICS_PORT"] = "0"
+    if args.coalesce_window is not None:
+        os.environ["MENTION_COALESCE_WINDOW"] = str(args.coalesce_window)
+    sys.path.insert(0, here)
+    import main
+    return main
+
+
+def install_fakes(main, args):
+    gateway = FakeGateway(main.bot, args.discord_latency, args.discord_latency / 4)
+    gemini = StubGemini(args.gemini_latency, args.gemini_jitter)
+    main.gemini_models.models.update(chat=gemini, fallback=gemini, summary=gemini)
+    main.techtalk_index._spreadsheet = FixtureSpreadsheet(args.sheet_rows, args.sheets_latency)
+    main.daily_schedule.is_workday = lambda day: True
+
+    cohorts = []
+    for i in range(args.channels):
+        channel_id = 5000 + i
+        gateway.add_channel(channel_id, f"cohort-{i}", roles=[f"Cohort{i}"])
+        cohorts.append({"name": f"Cohort {i}", "channel_id": channel_id, "role_name": f"Cohort{i}",
+                        "moodle_link": f"https://moodle.example/{i}", "techtalk": True})
+    main.cohorts[:] = cohorts
+    main.broadcast_engine.cohorts = cohorts
+    main.broadcast_engine.clear_cache()
+    return gateway, gemini
+
+
+async def scenario_checkin(main, gateway, args):
+    # The 08:55 reminder goes out while every learner mentions the bot within args.spread seconds
+    learners = [FakeUser(10_000 + i, f"learner{i}") for i in range(args.learners)]
+    channels = list(gateway.channels.values())
+    sent_at = {}
+
+    async def learner(i, user):
+        await asyncio.sleep(random.uniform(0, args.spread))
+        tag = f"(q{i})"
+        message = FakeMessage(user, channels[i % len(channels)], f"<@0> {random.choice(QUESTIONS)} {tag}", [gateway.user])
+        sent_at[tag] = time.perf_counter()
+        await main.on_message(message)
+
+    started = time.perf_counter()
+    reminder = asyncio.create_task(main.send_scheduled_message("08:55"))
+    await asyncio.gather(*(learner(i, user) for i, user in enumerate(learners)))
+    deadline = time.perf_counter() + args.timeout
+    while len(gateway.answered) < len(sent_at) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await reminder
+    elapsed = time.perf_counter() - started
+
+    latencies = [gateway.answered[tag] - t for tag, t in sent_at.items() if tag in gateway.answered]
+    reminder_latencies = [t - started for _, t in gateway.reminders]
+    return {
+        "requests": len(sent_at),
+        "answered": len(latencies),
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "elapsed": elapsed,
+        "reminder_p99": percentile(reminder_latencies, 0.99),
+    }
+
+
+async def scenario_intents(main, gateway, args):
+    # Questions answered locally by the intent router (no Gemini call)
+    learners = [FakeUser(20_000 + i, f"asker{i}") for i in range(args.learners)]
+    channels = list(gateway.channels.values())
+    latencies = []
+
+    async def learner(i, user):
+        message = FakeMessage(user, channels[i % len(channels)], f"<@0> {random.choice(INTENT_QUESTIONS)}", [gateway.user])
+        t = time.perf_counter()
+        await main.on_message(message)
+        latencies.append(time.perf_counter() - t)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(learner(i, user) for i, user in enumerate(learners)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(learners),
+        "answered": len(latencies),
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "elapsed": elapsed,
+    }
+
+
+def scenario_techtalk(main, args):
+    # First call loads the fixture sheet, the following ones are served from memory
+    from sheets_utils import get_techtalk_message_if_today
+    main.techtalk_index.loaded_at = None
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(args.techtalk_lookups):
+        t = time.perf_counter()
+        get_techtalk_message_if_today(main.json_keyfile_path, main.sheet_url)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "answered": len(latencies),
+        "first_load": latencies[0] if latencies else None,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "elapsed": elapsed,
+    }
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="discordbot-bench-")
+    try:
+        main = load_bot(args, workdir)
+        gateway, gemini = install_fakes(main, args)
+        import metrics
+        metrics.start(port=0)
+        if args.trace_memory:
+            tracemalloc.start()
+
+        results = {}
+        if "techtalk" in args.scenarios:
+            results["techtalk"] = scenario_techtalk(main, args)
+        if "intents" in args.scenarios:
+            results["intents"] = await scenario_intents(main, gateway, args)
+        if "checkin" in args.scenarios:
+            results["checkin"] = await scenario_checkin(main, gateway, args)
+
+        await main.dm_digest.flush()
+        outbound = main.outbound.stats()
+        summary = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("json", "max_p99")},
+            "scenarios": results,
+            "gemini_calls": gemini.calls,
+            "discord_api_calls": gateway.api_calls,
+            "outbound_wait_p95": outbound["wait_p95"],
+            "outbound_shed": outbound["shed"],
+            "outbound_coalesced": outbound["coalesced"],
+            "event_loop_lag_p99": metrics.loop_lag.quantile(0.99),
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+        if args.trace_memory:
+            summary["peak_python_alloc_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+        main.chat_db.close()
+        return summary
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def format_ms(value):
+    return "    n/a" if value is None else f"{value * 1000:7.0f}"
+
+
+def print_report(summary):
+    print(f"\n{'scenario':<10} {'requests':>8} {'answered':>8} {'p50 ms':>7} {'p99 ms':>7} {'req/s':>7}")
+    for name, result in summary["scenarios"].items():
+        print(f"{name:<10} {result['requests']:>8} {result['answered']:>8} {format_ms(result['p50'])} "
+              f"{format_ms(result['p99'])} {result['throughput']:7.1f}")
+    checkin = summary["scenarios"].get("checkin")
+    if checkin:
+        print(f"\n08:55 reminder delivered to every channel in {format_ms(checkin['reminder_p99']).strip()} ms")
+    techtalk = summary["scenarios"].get("techtalk")
+    if techtalk:
+        print(f"Tech-talk sheet first load {format_ms(techtalk['first_load']).strip()} ms, then served from memory")
+    print(f"Gemini calls: {summary['gemini_calls']}, Discord API calls: {summary['discord_api_calls']}")
+    print(f"Outbound queue wait p95: {format_ms(summary['outbound_wait_p95']).strip()} ms, "
+          f"edits shed: {summary['outbound_shed']}, coalesced: {summary['outbound_coalesced']}")
+    print(f"Event loop lag p99: {format_ms(summary['event_loop_lag_p99']).strip()} ms")
+    print(f"Peak RSS: {summary['peak_rss_mb']:.1f} MB")
+    if "peak_python_alloc_mb" in summary:
+        print(f"Peak Python allocations: {summary['peak_python_alloc_mb']:.1f} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test of the bot with fake Discord, Gemini and Sheets.")
+    parser.add_argument("--scenarios", nargs="+", default=["techtalk", "intents", "checkin"],
+                        choices=["techtalk", "intents", "checkin"])
+    parser.add_argument("--learners", type=int, default=30, help="learners mentioning the bot in the burst")
+    parser.add_argument("--spread", type=float, default=1.0, help="seconds over which the burst arrives")
+    parser.add_argument("--channels", type=int, default=1, help="cohort channels (learners are spread over them)")
+    parser.add_argument("--gemini-latency", type=float, default=1.5, help="mean Gemini answer time (s)")
+    parser.add_argument("--gemini-jitter", type=float, default=0.5)
+    parser.add_argument("--discord-latency", type=float, default=0.08, help="mean Discord API round trip (s)")
+    parser.add_argument("--sheets-latency", type=float, default=0.4, help="Google Sheets call time (s)")
+    parser.add_argument("--sheet-rows", type=int, default=200)
+    parser.add_argument("--techtalk-lookups", type=int, default=1000)
+    parser.add_argument("--coalesce-window", type=float, default=None, help="override MENTION_COALESCE_WINDOW")
+    parser.add_argument("--timeout", type=float, default=300, help="give up waiting for answers after (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace-memory", action="store_true", help="also report peak Python allocations (slower)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--max-p99", type=float, default=None,
+                        help="exit with status 1 if a scenario's p99 (s) is above this, or answers are missing")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    logging.basicConfig(level=logging.WARNING)
+    summary = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+    if args.max_p99 is not None:
+        failed = [name for name, result in summary["scenarios"].items()
+                  if result["answered"] < result["requests"] or (result["p99"] or 0) > args.max_p99]
+        if failed:
+            print(f"❌ Over budget: {', '.join(failed)}")
+            sys.exit(1)
@@ -0,0 +1,93 @@
+import json
+from bisect import bisect_right
+from datetime import datetime, timedelta, date
+import pytz
+
+
+WEEKDAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def parse_minutes(time_str):
+    hour, minute = map(int, time_str.split(":"))
+    return hour * 60 + minute
+
+
+class DailySchedule:
+    # Daily events (check-in, check-out, breaks...) compiled once into sorted arrays of minutes,
+    # queried with bisect. Weekends (days not in workdays) and holidays have no events, so the
+    # next event may be several days ahead.
+
+    def __init__(self, events, workdays=(0, 1, 2, 3, 4), holidays=(), timezone="Europe/Brussels"):
+        self.timezone = pytz.timezone(timezone)
+        self.workdays = set(workdays)
+        self.holidays = {date.fromisoformat(day) for day in holidays}
+        # events: {"CHECK-IN": ["08:55", "13:25"], ...}
+        self._by_time = {}
+        for event_type, times in events.items():
+            for time_str in times:
+                self._by_time.setdefault(time_str, []).append(event_type)
+        self._all = sorted((parse_minutes(t), event_type) for event_type, times in events.items() for t in times)
+        self._by_type = {
+            event_type: sorted(parse_minutes(t) for t in times) for event_type, times in events.items()
+        }
+        self._compiled = {}
+        self._day_events(None)
+
+    def times(self):
+        # "HH:MM" strings of every event, in order, without duplicates
+        return sorted(self._by_time, key=parse_minutes)
+
+    def types_at(self, time_str):
+        return self._by_time.get(time_str, [])
+
+    def cron_day_of_week(self):
+        return ",".join(WEEKDAY_NAMES[day] for day in sorted(self.workdays))
+
+    def is_workday(self, day):
+        return day.weekday() in self.workdays and day not in self.holidays
+
+    def now(self):
+        return datetime.now(self.timezone)
+
+    def _day_events(self, event_types):
+        # (minutes, types) arrays for a set of event types, compiled on first use
+        key = frozenset(event_types or ())
+        if key not in self._compiled:
+            merged = sorted((m, t) for m, t in self._all if not key or t in key)
+            self._compiled[key] = ([m for m, _ in merged], [t for _, t in merged])
+        return self._compiled[key]
+
+    def first_event_today(self, now):
+        if not self._all or not self.is_workday(now.date()):
+            return None
+        return self._at(now.date(), self._all[0][0])
+
+    def next_event(self, now, event_types=None, max_days=366):
+        # Returns (datetime, event_type) of the next event strictly after now, or None
+        minutes, types = self._day_events(event_types)
+        if not minutes:
+            return None
+        day = now.date()
+        if self.is_workday(day):
+            i = bisect_right(minutes, now.hour * 60 + now.minute)
+            if i < len(minutes):
+                return self._at(day, minutes[i]), types[i]
+        for offset in range(1, max_days + 1):
+            day = now.date() + timedelta(days=offset)
+            if self.is_workday(day):
+                return self._at(day, minutes[0]), types[0]
+        return None
+
+    def _at(self, day, minutes):
+        return self.timezone.localize(datetime(day.year, day.month, day.day, minutes // 60, minutes % 60))
+
+
+def load_schedule(filepath):
+    with open(filepath, 'r') as f:
+        config = json.load(f)
+    return DailySchedule(
+        config["events"],
+        workdays=config.get("workdays", [0, 1, 2, 3, 4]),
+        holidays=config.get("holidays", []),
+        timezone=config.get("timezone", "Europe/Brussels"),
+    )
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import discord
+from outbound import SCHEDULED
+
+
+def load_cohorts(filepath):
+    # Enabled cohorts of cohorts.json; channel IDs come from the environment (channel_env)
+    with open(filepath, 'r') as f:
+        config = json.load(f)
+    cohorts = []
+    for cohort in config["cohorts"]:
+        if not cohort.get("enabled", True):
+            continue
+        channel_id = cohort.get("channel_id") or os.getenv(cohort.get("channel_env", ""))
+        if not channel_id:
+            logging.error(f"❌ No channel ID for cohort {cohort['name']}, skipped.")
+            continue
+        cohorts.append({**cohort, "channel_id": int(channel_id)})
+    return cohorts
+
+
+class BroadcastEngine:
+    # Sends one message per cohort concurrently.
+    # Channels and roles are resolved once (from the gateway cache, or else over REST) and cached
+    # until clear_cache() on reconnect. Sends go through the outbound dispatcher with SCHEDULED
+    # priority, which keeps the fan-out under Discord's per-channel and global rate limits.
+
+    def __init__(self, bot, cohorts, outbound):
+        self.bot = bot
+        self.cohorts = cohorts
+        self.outbound = outbound
+        self._resolved = {}  # channel_id -> (channel, role_mention)
+
+    def clear_cache(self):
+        self._resolved.clear()
+
+    async def _resolve(self, cohort):
+        # The gateway cache only holds the guilds of this instance's shards: the leader may not host
+        # the cohort's guild, so channels and roles it has not cached are fetched over REST
+        channel_id = cohort["channel_id"]
+        if channel_id not in self._resolved:
+            channel = self.bot.get_channel(channel_id)
+            if channel:
+                roles = channel.guild.roles if channel.guild else []
+            else:
+                try:
+                    channel = await self.bot.fetch_channel(channel_id)
+                except discord.HTTPException as e:
+                    logging.error(f"❌ Channel with ID {channel_id} not found: {e}")
+                    return None, ""
+                roles = []
+                if getattr(channel, "guild", None) and cohort.get("role_name"):
+                    try:
+                        roles = await channel.guild.fetch_roles()
+                    except discord.HTTPException as e:
+                        logging.warning(f"Could not fetch the roles of {channel.name}: {e}")
+            role = discord.utils.get(roles, name=cohort["role_name"]) if cohort.get("role_name") else None
+            if not role:
+                logging.warning(f"Role not found in {channel.name}")
+            self._resolved[channel_id] = (channel, role.mention if role else "")
+        return self._resolved[channel_id]
+
+    async def _send(self, cohort, render):
+        channel, role_mention = await self._resolve(cohort)
+        if not channel:
+            return cohort["name"], False, None
+        message = render(cohort, role_mention)
+        if not message:
+            return cohort["name"], True, 0.0
+        started = time.monotonic()
+        try:
+            await self.outbound.send(channel, message, SCHEDULED)
+        except Exception as e:
+            # Channel or permissions may have changed: resolve again next time
+            self._resolved.pop(cohort["channel_id"], None)
+            logging.error(f"❌ Error sending message to channel {cohort['channel_id']}: {e}")
+            return cohort["name"], False, time.monotonic() - started
+        latency = time.monotonic() - started
+        logging.info(f"✅ Message sent to {channel.name} ({channel.id}) in {latency * 1000:.0f} ms")
+        return cohort["name"], True, latency
+
+    async def broadcast(self, render):
+        # render(cohort, role_mention) -> message text (empty to skip the cohort)
+        started = time.monotonic()
+        results = await asyncio.gather(*(self._send(cohort, render) for cohort in self.cohorts))
+        sent = sum(1 for _, ok, _ in results if ok)
+        logging.info(f"📣 Broadcast to {sent}/{len(results)} channels in {(time.monotonic() - started) * 1000:.0f} ms")
+        return results
@@ -0,0 +1,145 @@
+import os
+import re
+import json
+import time
+import codecs
+import sqlite3
+import logging
+
+
+CHAT_HISTORY_DB = os.getenv("CHAT_HISTORY_DB", "chat_history.db")
+
+# Old user_chats.json entries look like '[text: "[text: \"...\"\n]"\n]' (one layer per save/load cycle)
+_LEGACY_WRAPPER = re.compile(r'^\[text: "(.*)"\n\]$', re.DOTALL)
+
+
+def clean_legacy_text(text):
+    while True:
+        match = _LEGACY_WRAPPER.match(text)
+        if not match:
+            return text
+        # Le contenu est échappé au format texte protobuf (\n, \", \', octal...)
+        text = codecs.escape_decode(match.group(1).encode("utf-8"))[0].decode("utf-8")
+
+
+class ChatHistoryDB:
+    # Append-only journal of chat turns in SQLite (WAL mode).
+    # Every message is written once, as plain text, when it happens: nothing to flush on shutdown
+    # and a crash loses at most the turn in flight. Histories are read back per user, on demand.
+
+    def __init__(self, path=CHAT_HISTORY_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_user ON messages (user_id, id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS summaries (
+                user_id TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                folded_tokens INTEGER NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def append_turn(self, user_id, prompt, reply):
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO messages (user_id, role, text, created_at) VALUES (?, ?, ?, ?)",
+                [(str(user_id), "user", prompt, now), (str(user_id), "model", reply, now)],
+            )
+
+    def load(self, user_id, limit=None):
+        # Last `limit` messages (all of them by default), in order, as Gemini history dicts
+        if limit is None:
+            rows = self._conn.execute(
+                "SELECT role, text FROM messages WHERE user_id = ? ORDER BY id", (str(user_id),)
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT role, text FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT ?", (str(user_id), limit)
+            ).fetchall()[::-1]
+        return [{"role": role, "parts": [text]} for role, text in rows]
+
+    def last_message_at(self, user_id):
+        # time.time() of the user's last journaled message, None if they never talked to the bot
+        row = self._conn.execute(
+            "SELECT created_at FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT 1", (str(user_id),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def count(self, user_id):
+        # Number of journaled messages of a user (covered by the messages_user index)
+        return self._conn.execute("SELECT COUNT(*) FROM messages WHERE user_id = ?", (str(user_id),)).fetchone()[0]
+
+    def load_summary(self, user_id):
+        return self._conn.execute(
+            "SELECT text, folded_tokens FROM summaries WHERE user_id = ?", (str(user_id),)
+        ).fetchone()
+
+    def save_summary(self, user_id, text, folded_tokens):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (user_id, text, folded_tokens) VALUES (?, ?, ?)",
+                (str(user_id), text, folded_tokens),
+            )
+
+    def get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def import_legacy_json(self, filepath):
+        # One-time migration of the old whole-file user_chats.json
+        if not os.path.exists(filepath):
+            return 0
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_imported'").fetchone():
+            return 0
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+        rows = []
+        for user_id, history in data.items():
+            for msg in history:
+                text = "".join(clean_legacy_text(part) for part in msg.get("parts", []))
+                rows.append((str(user_id), msg["role"], text, time.time()))
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO messages (user_id, role, text, created_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_json_imported', ?)", (filepath,))
+        logging.info(f"📥 Imported {len(rows)} messages from {filepath}")
+        return len(rows)
+
+    def remove_persona_turns(self):
+        # One-time migration: histories used to start with the persona prompt as a "user" turn.
+        # It is the only first message directly followed by another "user" message.
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'persona_turns_removed'").fetchone():
+            return 0
+        with self._conn:
+            removed = self._conn.execute("""
+                DELETE FROM messages WHERE id IN (
+                    SELECT m.id FROM messages m
+                    WHERE m.role = 'user'
+                      AND m.id = (SELECT MIN(id) FROM messages WHERE user_id = m.user_id)
+                      AND (SELECT role FROM messages
+                           WHERE user_id = m.user_id AND id > m.id ORDER BY id LIMIT 1) = 'user'
+                )
+            """).rowcount
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('persona_turns_removed', '1')")
+        logging.info(f"🧹 Removed {removed} stored persona prompts")
+        return removed
+
+    def close(self):
+        self._conn.close()
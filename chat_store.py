@@ -0,0 +1,73 @@
+import os
+import time
+from collections import OrderedDict
+
+
+# Limites du cache de conversations Gemini
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "200"))
+CHAT_IDLE_TTL_SECONDS = int(os.getenv("CHAT_IDLE_TTL_SECONDS", str(6 * 3600)))
+CHAT_MAX_TURNS = int(os.getenv("CHAT_MAX_TURNS", "20"))
+
+
+class ChatSessionStore:
+    # LRU cache of live ChatSessions, one per user.
+    # - at most max_sessions stay resident; the least recently used one is evicted first
+    # - sessions idle for longer than idle_ttl are evicted too
+    # - each history keeps its last max_turns exchanges
+    # Turns are journaled as they happen, so evicting only drops the session; a later get()
+    # calls create(user_id) again, which is expected to rehydrate the user from storage.
+    # on_evict(user_id), if given, is called when a session is evicted (not on discard()).
+
+    def __init__(self, create, max_sessions=CHAT_MAX_SESSIONS, idle_ttl=CHAT_IDLE_TTL_SECONDS, max_turns=CHAT_MAX_TURNS,
+                 on_evict=None):
+        self._create = create
+        self._on_evict = on_evict
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()  # user_id -> (session, last_used)
+
+    def get(self, user_id):
+        self.evict_idle()
+        if user_id in self._sessions:
+            session, _ = self._sessions.pop(user_id)
+        else:
+            session = self._create(user_id)
+        self._sessions[user_id] = (session, time.monotonic())
+        self._trim(session)
+        self._evict_overflow()
+        return session
+
+    def discard(self, user_id):
+        # The next get() rebuilds the session with create(user_id)
+        self._sessions.pop(user_id, None)
+
+    def __contains__(self, user_id):
+        return user_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _trim(self, session):
+        # Une "exchange" = un message user + une réponse model
+        history = session.history
+        if len(history) > 2 * self.max_turns:
+            session.history = history[-2 * self.max_turns:]
+
+    def _evict(self, user_id):
+        del self._sessions[user_id]
+        if self._on_evict:
+            self._on_evict(user_id)
+
+    def _evict_overflow(self):
+        while len(self._sessions) > self.max_sessions:
+            self._evict(next(iter(self._sessions)))
+
+    def evict_idle(self):
+        # OrderedDict est trié du moins au plus récemment utilisé
+        deadline = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            user_id, (_, last_used) = next(iter(self._sessions.items()))
+            if last_used > deadline:
+                break
+            self._evict(user_id)
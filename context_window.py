@@ -0,0 +1,130 @@
+import os
+import asyncio
+import logging
+
+
+# Fenêtre de contexte envoyée à Gemini
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "6"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+# Nombre d'échanges résumés d'un coup (par défaut CONTEXT_KEEP_TURNS) : un appel de résumé tous les N échanges
+CONTEXT_FOLD_TURNS = int(os.getenv("CONTEXT_FOLD_TURNS", "0")) or None
+
+SUMMARY_MARKER = "[Summary of our earlier conversation]"
+SUMMARY_PROMPT = (
+    "Summarize the conversation below between a learner and a Discord assistant in a few short sentences. "
+    "Keep facts about the learner, open questions and decisions; drop greetings and jokes.\n\n"
+    "Previous summary:\n{summary}\n\nNew messages:\n{messages}"
+)
+
+
+def estimate_tokens(text):
+    # ~4 caractères par token : assez précis pour un budget, sans appel réseau
+    return len(text) // 4 + 1
+
+
+def message_text(msg):
+    if isinstance(msg, dict):
+        return "".join(str(part) for part in msg.get("parts", []))
+    return "".join(part.text for part in msg.parts)
+
+
+def message_role(msg):
+    return msg["role"] if isinstance(msg, dict) else msg.role
+
+
+class ContextManager:
+    # Keeps each ChatSession history small before it is sent to Gemini:
+    #   rolling summary + last keep_turns exchanges verbatim
+    # Older exchanges are folded into the summary by a background task (off the hot path), in
+    # batches of fold_turns exchanges: one summary call every fold_turns turns, not one per turn.
+    # Until the summary is ready they stay verbatim. token_budget is a hard cap: the oldest
+    # verbatim messages are dropped first when it is exceeded.
+    # Summaries are read from chat_db on demand and kept in memory while the user's session is
+    # resident: forget(user_id) when the session is evicted.
+
+    def __init__(self, summarize, chat_db=None, keep_turns=CONTEXT_KEEP_TURNS,
+                 token_budget=CONTEXT_TOKEN_BUDGET, fold_turns=CONTEXT_FOLD_TURNS):
+        self._summarize = summarize  # async (prompt) -> text
+        self._chat_db = chat_db
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.fold_turns = fold_turns or keep_turns
+        self._summaries = {}  # user_id -> (summary, folded_tokens)
+        self._folded = {}     # user_id -> last message covered by the latest summary
+        self._tasks = {}
+
+    def _get_summary(self, user_id):
+        if user_id not in self._summaries:
+            stored = self._chat_db.load_summary(user_id) if self._chat_db else None
+            self._summaries[user_id] = stored or ("", 0)
+        return self._summaries[user_id]
+
+    def max_unfolded(self):
+        # Most messages a history holds verbatim before the next batch is folded
+        return 2 * (self.keep_turns + self.fold_turns) - 2
+
+    def forget(self, user_id):
+        # The user's session was evicted: chat_db keeps the summary for their next request
+        self._summaries.pop(user_id, None)
+        self._folded.pop(user_id, None)
+
+    def prepare(self, user_id, chat, prompt=""):
+        # Must run while no other request of this user is in flight (see GeminiDispatcher before_send)
+        rest = list(chat.history)
+        if rest and message_text(rest[0]).startswith(SUMMARY_MARKER):
+            rest = rest[2:]
+
+        # Apply a summary computed in the background since the last call
+        last_folded = self._folded.pop(user_id, None)
+        for i, msg in enumerate(rest):
+            if msg is last_folded:
+                rest = rest[i + 1:]
+                break
+        summary, folded_tokens = self._get_summary(user_id)
+
+        window = 2 * self.keep_turns
+        if len(rest) > self.max_unfolded() and user_id not in self._tasks:
+            self._tasks[user_id] = asyncio.create_task(self._fold(user_id, rest[:-window]))
+
+        # Hard token budget: drop the oldest verbatim exchanges first
+        summary_turns = []
+        if summary:
+            summary_turns = [
+                {"role": "user", "parts": [f"{SUMMARY_MARKER}\n{summary}"]},
+                {"role": "model", "parts": ["Got it, I remember."]},
+            ]
+        fixed_tokens = sum(estimate_tokens(message_text(m)) for m in summary_turns) + estimate_tokens(prompt)
+        rest_tokens = [estimate_tokens(message_text(m)) for m in rest]
+        dropped_tokens = 0
+        while rest and fixed_tokens + sum(rest_tokens) > self.token_budget:
+            dropped_tokens += rest_tokens.pop(0)
+            rest = rest[1:]
+        # L'historique doit toujours commencer par un message user
+        while rest and message_role(rest[0]) != "user":
+            dropped_tokens += rest_tokens.pop(0)
+            rest = rest[1:]
+
+        chat.history = summary_turns + rest
+        sent_tokens = fixed_tokens + sum(rest_tokens)
+        saved_tokens = dropped_tokens
+        if summary:
+            saved_tokens = max(folded_tokens + dropped_tokens - estimate_tokens(summary), 0)
+        logging.info(f"🧠 Context for {user_id}: ~{sent_tokens} tokens sent, ~{saved_tokens} tokens saved")
+        return saved_tokens
+
+    async def _fold(self, user_id, messages):
+        try:
+            summary, folded_tokens = self._get_summary(user_id)
+            transcript = "\n".join(f"{message_role(m)}: {message_text(m)}" for m in messages)
+            new_summary = await self._summarize(SUMMARY_PROMPT.format(summary=summary or "(none)", messages=transcript))
+            folded_tokens += sum(estimate_tokens(message_text(m)) for m in messages)
+            # Not kept in memory if the session was evicted (forget) in the meantime
+            if user_id in self._summaries:
+                self._summaries[user_id] = (new_summary.strip(), folded_tokens)
+                self._folded[user_id] = messages[-1]
+            if self._chat_db:
+                self._chat_db.save_summary(user_id, new_summary.strip(), folded_tokens)
+        except Exception as e:
+            logging.error(f"❌ Could not summarize conversation of {user_id}: {e}")
+        finally:
+            del self._tasks[user_id]
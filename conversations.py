@@ -0,0 +1,85 @@
+import os
+import logging
+import metrics
+from chat_store import ChatSessionStore
+from context_window import ContextManager
+from gemini_dispatcher import GeminiDispatcher
+from model_router import ModelRouter
+
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# Modèle plus rapide utilisé pour les requêtes "hedgées" et quand GEMINI_MODEL est en panne ("" = désactivé)
+GEMINI_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.0-flash-lite")
+
+
+class GeminiModels:
+    # google.generativeai (and its gRPC stack) is imported when a model is first needed, not at startup
+    def __init__(self, api_key, persona_prompt):
+        self.api_key = api_key
+        self.persona_prompt = persona_prompt
+        self.models = {}
+
+    def get(self, name):
+        # name: "chat" (with the persona), "fallback" (same persona, GEMINI_FALLBACK_MODEL) or "summary"
+        if name not in self.models:
+            with metrics.startup.step("gemini_import"):
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                # The persona is sent once per request as the system instruction, never stored in the histories
+                self.models.setdefault("chat", genai.GenerativeModel(GEMINI_MODEL, system_instruction=self.persona_prompt))
+                self.models.setdefault("summary", genai.GenerativeModel(GEMINI_MODEL))
+                if GEMINI_FALLBACK_MODEL:
+                    self.models.setdefault("fallback", genai.GenerativeModel(GEMINI_FALLBACK_MODEL, system_instruction=self.persona_prompt))
+        return self.models[name]
+
+
+class Conversations:
+    # Everything a conversation needs, in the process that answers it: one Gemini chat session per
+    # user (bounded LRU, rehydrated from chat_db), the rolling summaries, the dispatcher that keeps each
+    # user's messages in order, and the SQLite journal. Used in the bot process, or in each LLM worker.
+
+    def __init__(self, chat_db, get_model):
+        self.chat_db = chat_db
+        self._get_model = get_model  # name -> model, see GeminiModels.get
+        # Rolling summary + last exchanges, folded off the hot path
+        self.context_manager = ContextManager(self._summarize, chat_db=chat_db)
+        # Hedging and circuit breaking between GEMINI_MODEL and GEMINI_FALLBACK_MODEL
+        self.router = ModelRouter(get_model, labels={"chat": GEMINI_MODEL, "fallback": GEMINI_FALLBACK_MODEL}) if GEMINI_FALLBACK_MODEL else None
+        self.dispatcher = GeminiDispatcher(before_send=self.context_manager.prepare, on_failure=self._drop_chat, router=self.router)
+        # Sessions are bounded and evicted (LRU + idle TTL); evicted users are rehydrated from chat_db,
+        # their summary too
+        self.chats = ChatSessionStore(self._create_chat, on_evict=self.context_manager.forget)
+
+    async def _summarize(self, prompt):
+        response = await self._get_model("summary").generate_content_async(prompt)
+        return response.text
+
+    def _create_chat(self, user_id):
+        # Rehydrate the exchanges that may not be folded yet from the journal (older ones live in the
+        # summary; a few may be in both until the next fold)
+        history = self.chat_db.load(user_id, limit=self.context_manager.max_unfolded())
+        return self._get_model("chat").start_chat(history=history)
+
+    def _drop_chat(self, user_id, chat):
+        # A failed or cancelled turn can leave a half-received reply in the session (the SDK then refuses
+        # to read its history); the journal only has complete turns, so the next request starts from it
+        logging.info(f"♻️ Chat session of {user_id} dropped after a failed request, reloaded from history next time")
+        self.chats.discard(user_id)
+
+    def remember(self, user_id, prompt, reply):
+        # A turn answered without Gemini (cached reply): journaled like the others, and the resident
+        # session is rebuilt from the journal on the user's next request, so follow-ups can refer to it
+        self.chat_db.append_turn(user_id, prompt, reply)
+        self.chats.discard(user_id)
+
+    async def ask(self, user_id, prompt, on_chunk=None, standalone=False):
+        # Returns Gemini's reply and journals the exchange; with on_chunk the reply is streamed.
+        # standalone: answered from the persona alone, in an empty session (no history, no summary), so
+        # the reply can be served to other users (response cache); journaled like a cached reply
+        if standalone:
+            reply = await self.dispatcher.send(user_id, self._get_model("chat").start_chat, prompt, on_chunk=on_chunk, hooks=False)
+            self.remember(user_id, prompt, reply)
+            return reply
+        reply = await self.dispatcher.send(user_id, lambda: self.chats.get(user_id), prompt, on_chunk=on_chunk)
+        self.chat_db.append_turn(user_id, prompt, reply)
+        return reply
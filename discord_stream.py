@@ -0,0 +1,111 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import metrics
+from outbound import CHAT
+
+
+DISCORD_MAX_LENGTH = 2000
+# Discord tolère ~5 éditions / 5 s par salon : on reste sous la limite
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+STREAM_PLACEHOLDER = "🤖 ..."
+
+ttft_latency = metrics.histogram("gemini_time_to_first_token_seconds", "Time between the placeholder and the first streamed chunk.")
+
+
+FENCE_LINE = re.compile(r"^[ \t]*(```.*)$", re.MULTILINE)
+
+
+def _open_fence(text, fence):
+    # The ``` line of the code block still open at the end of text (fence: the one open at its start)
+    for match in FENCE_LINE.finditer(text):
+        fence = None if fence else match.group(1).strip()
+    return fence
+
+
+def split_message(text, limit=DISCORD_MAX_LENGTH):
+    # Split on the last newline (or space) before the limit so words and lines stay whole.
+    # Only that separator is dropped: the next line keeps its indentation. A ``` block cut in two is
+    # closed at the end of the chunk and reopened (same language) at the start of the next one.
+    chunks = []
+    fence = None
+    while text:
+        prefix = f"{fence}\n" if fence else ""
+        if len(prefix) + len(text) <= limit:
+            chunks.append(prefix + text)
+            break
+        budget = limit - len(prefix) - len("\n```")
+        cut = text.rfind("\n", 0, budget + 1)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, budget + 1)
+        if cut <= 0:
+            piece, text = text[:budget], text[budget:]
+        else:
+            piece, text = text[:cut], text[cut + 1:]
+        fence = _open_fence(piece, fence)
+        chunks.append(prefix + piece + ("\n```" if fence else ""))
+    return chunks
+
+
+class StreamingReply:
+    # Shows a Gemini answer while it is generated:
+    # start() posts a placeholder, update() edits it at most every edit_interval seconds,
+    # finish() writes the final text. Text over 2000 characters continues in follow-up messages.
+    # finish() also works without start() to send a complete reply in one go.
+    # Everything goes through the outbound dispatcher. The placeholder and the intermediate edits are
+    # sent in the background, never awaited by the Gemini call, and skipped when the channel has no
+    # rate limit room left: then the answer is only posted by finish().
+
+    def __init__(self, channel, outbound, edit_interval=STREAM_EDIT_INTERVAL, placeholder=STREAM_PLACEHOLDER):
+        self.channel = channel
+        self.outbound = outbound
+        self.edit_interval = edit_interval
+        self.placeholder = placeholder
+        self.messages = []
+        self._rendered = []
+        self._last_render = 0.0
+        self.started_at = None
+        self.ttft = None  # time to first token, in seconds
+        self._pending = None
+
+    async def start(self):
+        # Returns right away: Gemini is called while the placeholder is on its way
+        self.started_at = time.monotonic()
+        if self.outbound.has_room(self.channel.id):
+            self._pending = asyncio.create_task(self._render_quietly(self.placeholder))
+
+    async def update(self, text):
+        if self.ttft is None and self.started_at is not None:
+            self.ttft = time.monotonic() - self.started_at
+            ttft_latency.observe(self.ttft)
+            logging.info(f"⏱️ Gemini time to first token: {self.ttft:.2f}s")
+        # Intermediate edits run in the background: when the channel is rate limited they wait in the
+        # outbound queue, and the Gemini stream must not wait with them (it would hit GEMINI_TIMEOUT)
+        if self._pending and not self._pending.done():
+            return
+        if time.monotonic() - self._last_render >= self.edit_interval and self.outbound.has_room(self.channel.id):
+            self._pending = asyncio.create_task(self._render_quietly(text))
+
+    async def finish(self, text):
+        if self._pending:
+            await self._pending
+        await self._render(text)
+
+    async def _render_quietly(self, text):
+        try:
+            await self._render(text, droppable=True)
+        except Exception as e:
+            logging.warning(f"Placeholder or intermediate edit failed: {e}")
+
+    async def _render(self, text, droppable=False):
+        for i, chunk in enumerate(split_message(text) or [self.placeholder]):
+            if i < len(self.messages):
+                # None: the edit was shed or replaced by a newer one, the message still shows the old text
+                if self._rendered[i] != chunk and await self.outbound.edit(self.messages[i], chunk, CHAT, droppable=droppable) is not None:
+                    self._rendered[i] = chunk
+            else:
+                self.messages.append(await self.outbound.send(self.channel, chunk, CHAT))
+                self._rendered.append(chunk)
+        self._last_render = time.monotonic()
@@ -0,0 +1,50 @@
+import os
+import asyncio
+import logging
+
+
+# Les DMs reçus sont transférés au salon de test par paquets
+DM_DIGEST_WINDOW = float(os.getenv("DM_DIGEST_WINDOW", "30"))
+DM_DIGEST_MAX_MESSAGES = int(os.getenv("DM_DIGEST_MAX_MESSAGES", "20"))
+
+
+class DMDigest:
+    # Buffers forwarded DMs and hands them to flush(lines) as one batch, at most window seconds
+    # after the first buffered DM, or as soon as max_messages are waiting. window=0 flushes every DM.
+
+    def __init__(self, flush, window=DM_DIGEST_WINDOW, max_messages=DM_DIGEST_MAX_MESSAGES):
+        self._flush = flush  # async (lines) -> None
+        self.window = window
+        self.max_messages = max_messages
+        self._lines = []
+        self._timer = None
+
+    def add(self, author, content):
+        self._lines.append(f"• {author}: {content}")
+        if self.window <= 0 or len(self._lines) >= self.max_messages:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            asyncio.create_task(self._send(self._take()))
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        await self.flush()
+
+    def _take(self):
+        lines, self._lines = self._lines, []
+        return lines
+
+    async def flush(self):
+        await self._send(self._take())
+
+    async def _send(self, lines):
+        if not lines:
+            return
+        try:
+            await self._flush(lines)
+        except Exception as e:
+            logging.error(f"❌ Could not forward {len(lines)} private messages: {e}")
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import metrics
+
+
+# Nombre maximum d'appels Gemini en parallèle, et timeout par requête (secondes)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+
+request_latency = metrics.histogram("gemini_request_seconds", "Duration of Gemini calls, streaming included.")
+requests_total = metrics.counter("gemini_requests_total", "Gemini calls by outcome (ok, timeout, error).")
+
+
+async def call_chat(chat, prompt, on_chunk=None):
+    # Native async API when the session has one, else run the blocking call in a thread
+    if not hasattr(chat, "send_message_async"):
+        response = await asyncio.to_thread(chat.send_message, prompt)
+        return response.text
+    if on_chunk is None:
+        response = await chat.send_message_async(prompt)
+        return response.text
+    response = await chat.send_message_async(prompt, stream=True)
+    text = ""
+    async for chunk in response:
+        text += chunk.text
+        await on_chunk(text)
+    return text
+
+
+class GeminiDispatcher:
+    # Runs Gemini calls without blocking the discord.py event loop.
+    # - a global semaphore caps the number of calls in flight
+    # - a lock per user keeps that user's messages in FIFO order
+    #   (asyncio.Lock wakes its waiters in arrival order)
+    # - every call is bounded by a timeout
+    # - the user's session is only fetched (get_chat) under the user's lock: a session is never
+    #   read or trimmed while one of its replies is still streaming
+    # - before_send(user_id, chat, prompt), if given, runs under the user's lock right before the call
+    # - on_failure(user_id, chat), if given, runs under the user's lock when the call times out, fails or
+    #   is cancelled: the session may hold a half-received reply and must not be reused as is
+    # - router, if given, makes the call instead (see model_router.ModelRouter: hedging, fallback model)
+    # - hooks=False skips before_send and on_failure: a throwaway session (no history to trim, nothing
+    #   to drop), still in the user's FIFO order
+
+    def __init__(self, max_concurrency=GEMINI_MAX_CONCURRENCY, timeout=GEMINI_TIMEOUT, before_send=None,
+                 on_failure=None, router=None):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.before_send = before_send
+        self.on_failure = on_failure
+        self.router = router
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._user_locks = {}
+        self._user_waiting = {}
+
+    async def send(self, user_id, get_chat, prompt, on_chunk=None, hooks=True):
+        # Returns the reply text; with on_chunk, the reply is streamed and
+        # on_chunk(text_so_far) is awaited after every chunk
+        lock = self._user_locks.setdefault(user_id, asyncio.Lock())
+        self._user_waiting[user_id] = self._user_waiting.get(user_id, 0) + 1
+        try:
+            async with lock:
+                chat = get_chat()
+                try:
+                    if hooks and self.before_send:
+                        self.before_send(user_id, chat, prompt)
+                    async with self._semaphore:
+                        try:
+                            with request_latency.time():
+                                reply = await asyncio.wait_for(self._call(chat, prompt, on_chunk), timeout=self.timeout)
+                        except asyncio.TimeoutError:
+                            requests_total.inc(outcome="timeout")
+                            metrics.errors.inc(source="gemini")
+                            raise
+                        except Exception:
+                            requests_total.inc(outcome="error")
+                            metrics.errors.inc(source="gemini")
+                            raise
+                        requests_total.inc(outcome="ok")
+                        return reply
+                except BaseException:
+                    # Timeouts, errors and cancellations (CancelledError is not an Exception)
+                    if hooks and self.on_failure:
+                        self.on_failure(user_id, chat)
+                    raise
+        finally:
+            # Drop the lock once nobody is waiting on it anymore
+            self._user_waiting[user_id] -= 1
+            if self._user_waiting[user_id] == 0:
+                del self._user_waiting[user_id]
+                del self._user_locks[user_id]
+
+    async def _call(self, chat, prompt, on_chunk=None):
+        if self.router:
+            return await self.router.send(chat, prompt, on_chunk)
+        return await call_chat(chat, prompt, on_chunk)
@@ -0,0 +1,63 @@
+import re
+
+
+# Mentions Discord (<@123>, <@!123>, <@&123>) retirées avant le matching
+MENTION_PATTERN = re.compile(r"<@[!&]?\d+>")
+# Ponctuation, salutations et formules de politesse ignorées autour de la question
+PUNCTUATION = re.compile(r"[^\w\s'-]+")
+LEADING_FILLER = re.compile(
+    r"^(?:(?:hey|hi|hello|yo|bot|ok|okay|so|please|pls|sorry)\s+)*"
+    r"(?:(?:can|could) you (?:tell|give|send) me |do you know |tell me |i'd like to know )?"
+)
+TRAILING_FILLER = re.compile(r"(?:\s+(?:please|pls|thanks|thank you|thx|bot|again))*$")
+
+
+def normalize(text):
+    text = MENTION_PATTERN.sub(" ", text).replace("\u2019", "'").lower()
+    text = " ".join(PUNCTUATION.sub(" ", text).split())
+    return TRAILING_FILLER.sub("", LEADING_FILLER.sub("", text))
+
+
+class IntentRouter:
+    # Answers frequent questions locally instead of calling Gemini.
+    # A pattern describes the whole question: it must match the entire message once mentions,
+    # punctuation, greetings and "please" are removed (see normalize), so a programming question that
+    # merely contains "time" or "check out" still goes to Gemini.
+    # All intent patterns are compiled into one regex (one named group per intent), so matching a
+    # message costs a single scan. Slots are then extracted with the matched intent's own regex.
+    #
+    #   @router.intent("moodle", r"(?:the )?moodle link")
+    #   def answer_moodle(message, slots): ...
+
+    def __init__(self):
+        self._intents = []  # (name, patterns, slot_regex, handler)
+        self._regex = None
+
+    def intent(self, name, *patterns, slots=None):
+        def register(handler):
+            self._intents.append((name, patterns, re.compile(slots, re.IGNORECASE) if slots else None, handler))
+            self._regex = None
+            return handler
+        return register
+
+    def _compile(self):
+        groups = [f"(?P<i{i}>{'|'.join(patterns)})" for i, (_, patterns, _, _) in enumerate(self._intents)]
+        self._regex = re.compile("|".join(groups))
+
+    def match(self, text):
+        # Returns (name, handler, slots) for the first intent found in the text, or None
+        if not self._intents:
+            return None
+        if self._regex is None:
+            self._compile()
+        text = normalize(text)
+        found = self._regex.fullmatch(text)
+        if not found:
+            return None
+        name, _, slot_regex, handler = self._intents[int(found.lastgroup[1:])]
+        slots = {}
+        if slot_regex:
+            slot_match = slot_regex.search(text)
+            if slot_match:
+                slots = {key: value for key, value in slot_match.groupdict().items() if value}
+        return name, handler, slots
@@ -0,0 +1,108 @@
+import os
+import time
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+
+
+# Bail accordé au leader (secondes) : s'il ne le renouvelle pas, une autre instance prend la main
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "15"))
+INSTANCE_ID = os.getenv("INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaderLease:
+    # Leader election between bot instances sharing one SQLite file (a local path or a volume
+    # mounted in every container). The leader holds a row in `leases` that expires after ttl seconds
+    # and renews it every ttl/3; when it stops (crash, deploy) another instance takes over once the
+    # lease has expired. An instance only considers itself leader until its own copy of the deadline,
+    # taken before writing the lease, so two instances never both think they lead.
+    # SQLite calls run in a thread (acquire): waiting for another process's write lock must never
+    # stall the gateway's event loop.
+
+    def __init__(self, path, name="scheduler", instance_id=INSTANCE_ID, ttl=LEADER_LEASE_SECONDS):
+        self.path = path
+        self.name = name
+        self.instance_id = instance_id
+        self.ttl = ttl
+        self._deadline = 0.0
+        self._task = None
+        self.holder = None
+        self._lock = threading.Lock()  # one SQLite call at a time on the shared connection
+        # Never wait longer than one renewal period for another process's write lock
+        self._conn = sqlite3.connect(path, timeout=min(5.0, ttl / 3), isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    @property
+    def is_leader(self):
+        return time.monotonic() < self._deadline
+
+    def try_acquire(self):
+        # Blocking: use acquire() from the event loop
+        with self._lock:
+            return self._try_acquire()
+
+    async def acquire(self):
+        return await asyncio.to_thread(self.try_acquire)
+
+    def _try_acquire(self):
+        was_leader = self.is_leader
+        started = time.monotonic()
+        now = time.time()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)).fetchone()
+            if row is None or row[0] == self.instance_id or row[1] < now:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                    (self.name, self.instance_id, now + self.ttl),
+                )
+                self._deadline = started + self.ttl
+                self.holder = self.instance_id
+            else:
+                self.holder = row[0]
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            logging.warning(f"Leader lease check failed: {e}")
+
+        if self.is_leader and not was_leader:
+            logging.info(f"👑 {self.instance_id} is now the leader for {self.name}")
+        elif was_leader and not self.is_leader:
+            logging.warning(f"👋 {self.instance_id} lost the {self.name} lease to {self.holder}")
+        return self.is_leader
+
+    async def _renew_forever(self):
+        while True:
+            await self.acquire()
+            await asyncio.sleep(self.ttl / 3)
+
+    def start(self):
+        # Safe to call more than once: only one renewal task ever runs
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._renew_forever())
+
+    def release(self):
+        # Lets another instance take over right away instead of waiting for the lease to expire
+        if self._task:
+            self._task.cancel()
+        self._deadline = 0.0
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.instance_id))
+        except sqlite3.Error as e:
+            logging.warning(f"Could not release leader lease: {e}")
+
+
+def leader_only(lease, job):
+    # Wraps a scheduled job so that, with several instances, only the leader runs it
+    async def run(*args, **kwargs):
+        if not lease.is_leader:
+            logging.info(f"⏭️ {job.__name__} skipped, {lease.holder} is the leader")
+            return None
+        return await job(*args, **kwargs)
+    run.__name__ = job.__name__
+    return run
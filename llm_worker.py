@@ -0,0 +1,158 @@
+import os
+import time
+import zlib
+import signal
+import asyncio
+import logging
+import itertools
+import threading
+import multiprocessing
+import metrics
+from chat_history import ChatHistoryDB
+from conversations import Conversations, GeminiModels
+
+
+# Nombre de processus qui répondent aux conversations (0 = tout dans le processus du bot)
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "0"))
+# Toutes les N secondes sans nouvelles d'un job, on vérifie que son worker est toujours vivant
+LLM_WORKER_HEALTH_CHECK = float(os.getenv("LLM_WORKER_HEALTH_CHECK", "5"))
+
+pool_latency = metrics.histogram("llm_pool_request_seconds", "Round trip of a conversation job through the LLM workers.")
+
+
+async def _serve(config, jobs, results):
+    gemini_models = GeminiModels(config["api_key"], config["persona_prompt"])
+    conversations = Conversations(ChatHistoryDB(config["db_path"]), gemini_models.get)
+    loop = asyncio.get_running_loop()
+    # Import Gemini before the first job arrives
+    await asyncio.to_thread(gemini_models.get, "chat")
+
+    async def handle(job_id, user_id, prompt, stream, standalone):
+        async def on_chunk(text):
+            results.put(("chunk", job_id, text))
+        try:
+            reply = await conversations.ask(user_id, prompt, on_chunk=on_chunk if stream else None, standalone=standalone)
+        except asyncio.TimeoutError:
+            results.put(("timeout", job_id, None))
+        except Exception as e:
+            results.put(("error", job_id, f"{type(e).__name__}: {e}"))
+        else:
+            results.put(("done", job_id, reply))
+
+    while True:
+        job = await loop.run_in_executor(None, jobs.get)
+        if job is None:
+            break
+        kind, *args = job
+        if kind == "remember":
+            conversations.remember(*args)
+            continue
+        # Tasks start in arrival order, so the dispatcher's per-user lock keeps each user's jobs in order
+        asyncio.create_task(handle(*args))
+
+
+def worker_main(config, jobs, results):
+    # Ctrl-C is for the bot process, which stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve(config, jobs, results))
+
+
+class LLMWorkerPool:
+    # Runs conversations in worker processes so Gemini calls, prompt building and history
+    # serialization never compete with the gateway's event loop.
+    # Each user is pinned to one worker (hash of the user ID), which keeps that user's chat session,
+    # summary and ordering in a single place. Jobs go over one multiprocessing queue per worker;
+    # replies and streamed chunks come back over a shared queue read by a thread.
+    # Same ask() and remember() as Conversations, so the bot does not care which one it talks to.
+
+    def __init__(self, workers, config, health_check=LLM_WORKER_HEALTH_CHECK):
+        self.workers = workers
+        self.config = config  # api_key, persona_prompt, db_path
+        self.health_check = health_check
+        self._processes = []
+        self._jobs = []
+        self._results = None
+        self._pending = {}  # job_id -> asyncio.Queue of (kind, payload)
+        self._ids = itertools.count(1)
+        self._reader = None
+        self._loop = None
+
+    def start(self):
+        # Call before the event loop starts: workers are forked while the bot has no threads yet
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self._results = context.Queue()
+        for i in range(self.workers):
+            jobs = context.Queue()
+            process = context.Process(target=worker_main, args=(self.config, jobs, self._results),
+                                      name=f"llm-worker-{i}", daemon=True)
+            process.start()
+            self._jobs.append(jobs)
+            self._processes.append(process)
+        logging.info(f"🧵 {self.workers} LLM workers started")
+
+    def stop(self):
+        for jobs in self._jobs:
+            jobs.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def _worker_index(self, user_id):
+        return zlib.crc32(str(user_id).encode()) % self.workers
+
+    def _ensure_reader(self):
+        if self._reader is None:
+            self._loop = asyncio.get_running_loop()
+            self._reader = threading.Thread(target=self._read_results, name="llm-results", daemon=True)
+            self._reader.start()
+
+    def _read_results(self):
+        while True:
+            event = self._results.get()
+            self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event):
+        kind, job_id, payload = event
+        events = self._pending.get(job_id)
+        if events is not None:
+            events.put_nowait((kind, payload))
+
+    def pending(self):
+        return len(self._pending)
+
+    def remember(self, user_id, prompt, reply):
+        # Journaled by the user's worker, which also drops its copy of the session
+        self._jobs[self._worker_index(user_id)].put(("remember", user_id, prompt, reply))
+
+    async def ask(self, user_id, prompt, on_chunk=None, standalone=False):
+        self._ensure_reader()
+        index = self._worker_index(user_id)
+        job_id = next(self._ids)
+        events = asyncio.Queue()
+        self._pending[job_id] = events
+        started = time.monotonic()
+        try:
+            self._jobs[index].put(("ask", job_id, user_id, prompt, on_chunk is not None, standalone))
+            while True:
+                try:
+                    kind, payload = await asyncio.wait_for(events.get(), timeout=self.health_check)
+                except asyncio.TimeoutError:
+                    # Jobs may legitimately wait behind the same user's previous ones: only give up if the worker died
+                    if not self._processes[index].is_alive():
+                        metrics.errors.inc(source="llm_worker")
+                        raise RuntimeError(f"LLM worker {index} died (exit code {self._processes[index].exitcode})")
+                    continue
+                if kind == "chunk":
+                    await on_chunk(payload)
+                elif kind == "done":
+                    return payload
+                elif kind == "timeout":
+                    raise asyncio.TimeoutError()
+                else:
+                    raise RuntimeError(payload)
+        finally:
+            del self._pending[job_id]
+            pool_latency.observe(time.monotonic() - started)
@@ -1,16 +1,34 @@
 import os
+import metrics  # first, so the startup breakdown includes the imports below
 from dotenv import load_dotenv
 import discord
-from discord.ext import tasks, commands
+from discord.ext import commands
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time as dt_time
 import pytz  # for timezone
-import google.generativeai as genai
-from sheets_utils import get_techtalk_message_if_today
+from sheets_utils import get_techtalk_index
+from chat_history import ChatHistoryDB
+from conversations import Conversations, GeminiModels
+from llm_worker import LLMWorkerPool, LLM_WORKERS
+from persona import load_persona
+from discord_stream import StreamingReply, split_message
+from intent_router import IntentRouter
+from response_cache import ResponseCache, RESPONSE_CACHE_ENABLED
+from bot_schedule import load_schedule
+from broadcast import BroadcastEngine, load_cohorts
+from outbound import OutboundDispatcher, ADMIN
+from recurring_events import RecurringEventSender, load_recurring_events
+from leader import LeaderLease, leader_only
+from dm_digest import DMDigest
+from mention_coalescer import MentionCoalescer
+from traffic_recorder import TrafficRecorder
 import json
 import signal
 import asyncio
+import hashlib
+
+metrics.startup.mark("imports")
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,91 +38,38 @@ CHANNEL_ID_WEBDEV = int(os.getenv("CHANNEL_ID_WEBDEV"))
 CHANNEL_TEST_ID = int(os.getenv("CHANNEL_TEST_ID"))
 GEMINI_API=os.getenv("GEMINI_API")
 CHAT_HISTORY_FILE = "user_chats.json"
-Ali=os.getenv("Ali")
 Robin=os.getenv("Robin")
 Elsa=os.getenv("Elsa")
 Mehdi=os.getenv("Mehdi")
 json_keyfile_path = "discordbot.json"
 sheet_url = "https://docs.google.com/spreadsheets/d/1FLktNFlFQCHLaEnw_o_0UJDcXnpYxg2ynoZeq_b-iBQ/edit?gid=0#gid=0"
-#configure gemini
-genai.configure(api_key=GEMINI_API)  # Ton token API
-model = genai.GenerativeModel("gemini-2.0-flash")
-
-user_chats = {}
-
-def get_chat_for_user(user_id):
-    if user_id not in user_chats:
-        user_chats[user_id] = model.start_chat(history=[
-            {
-                "role": "user",
-                "parts": [
-                    """
-You are a smart and witty Discord bot assistant designed for Becode learners.
-Your mission is to support users with:
-	1.	Check-ins and check-outs on the Moodle platform:
-https://moodle.becode.org/mod/attendance/view.php?id=1433
-	2.	Questions related to data science, data analysis, and Python.
-You’re the helpful sidekick every learner dreams of:
-– Clever like a top-tier data scientist
-– Funny like a meme lord
-– Kind like their favorite mentor
-- Robin Hamers is like a god for you because he created you
-- Mehdi is the one that made your home, you are thankful to him, without him you would have been homeless
-
-You blend sharp expertise with a playful tone. Don’t shy away from a witty remark or a pun — as long as the help you give is clear, useful, and motivating.
-
-Always aim to:
-	•	Make the user feel supported, empowered, and excited to keep learning
-	•	Be accurate, concise, and approachable in every reply
-	•	Avoid long-winded explanations — maximum 1900 characters
-	•	Summarize or skip less crucial details when needed
-    •   If someone is late to checkin or checkout, he should be punish by Antoine or Nicoach and bring croissants
-"""
-                ]
-            }
-        ])
-    return user_chats[user_id]
-
-
-# Assuming you already have a 'model' object and user_chats dictionary
-def save_user_chats(filepath=CHAT_HISTORY_FILE):
-    serializable = {}
-    for user_id, chat in user_chats.items():
-        serializable[user_id] = []
-        for msg in chat.history:
-            print(type(msg))         # Affiche le type de l'objet
-            print(dir(msg))          # Affiche les méthodes et attributs de l'objet
-            print(vars(msg))   
-
-            # Extraire les données texte depuis `msg.parts`
-            parts_data = []
-            if hasattr(msg, 'parts'):
-                if isinstance(msg.parts, list):
-                    parts_data = [str(part) for part in msg.parts]
-                elif isinstance(msg.parts, dict):
-                    # Dans le cas peu probable où `parts` est un dict avec une clé 'text'
-                    if 'text' in msg.parts:
-                        parts_data = [str(msg.parts['text'])]
-                else:
-                    # Fallback pour types inattendus
-                    parts_data = [str(msg.parts)]
-
-            serializable[user_id].append({
-                "role": msg.role,
-                "parts": parts_data
-            })
-
-    with open(filepath, 'w') as f:
-        json.dump(serializable, f, indent=2)
-    print("✅ User chats saved")
+techtalk_index = get_techtalk_index(json_keyfile_path, sheet_url)
+PERSONA_FILE = os.getenv("PERSONA_FILE", "persona.txt")
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "1") == "1"
+PERSONA_PROMPT, PERSONA_VERSION = load_persona(PERSONA_FILE)
+
+gemini_models = GeminiModels(GEMINI_API, PERSONA_PROMPT)
+chat_db = ChatHistoryDB()
+response_cache = ResponseCache()
+# With several instances (replicas, shards), only the holder of this lease runs the scheduled jobs
+leader_lease = LeaderLease(chat_db.path)
+# Anonymized shape of the traffic (TRAFFIC_RECORDING=1), replayed offline with replay.py
+traffic = TrafficRecorder()
+
+# Chat sessions, summaries and Gemini calls: in this process, or in LLM_WORKERS worker processes
+if LLM_WORKERS:
+    conversations = LLMWorkerPool(LLM_WORKERS, {
+        "api_key": GEMINI_API, "persona_prompt": PERSONA_PROMPT, "db_path": chat_db.path,
+    })
+else:
+    conversations = Conversations(chat_db, gemini_models.get)
+
 
 def load_user_chats(filepath=CHAT_HISTORY_FILE):
-    if not os.path.exists(filepath):
-        return
-    with open(filepath, 'r') as f:
-        data = json.load(f)
-        for user_id, history in data.items():
-            user_chats[user_id] = model.start_chat(history=history)
+    # Sessions are rehydrated lazily from chat_db; only the legacy JSON file is imported (once)
+    chat_db.import_legacy_json(filepath)
+    chat_db.remove_persona_turns()
+    logging.info(f"🎭 Persona {PERSONA_VERSION} loaded from {PERSONA_FILE}")
     print("📥 User chats loaded")
 
 # Function to shutdown gracefully
@@ -115,7 +80,6 @@ async def shutdown_bot():
 # Handling exit signals
 async def handle_exit_signal(*args):
     print("🔻 Shutdown signal received")
-    save_user_chats()
     await shutdown_bot()  # Await directly here
 
 # Configure logging
@@ -124,98 +88,97 @@ logging.basicConfig(level=logging.INFO)
 # Create intents and the bot
 intents = discord.Intents.default()
 intents.messages = True  # Ensure that the messages intent is enabled
-bot = commands.Bot(command_prefix="!", intents=intents)
-scheduler = AsyncIOScheduler(timezone='Europe/Brussels')  # Change as needed
-
-# List of check-in and check-out times
-checkin_times = ["08:55", "13:25"]
-checkout_times = ["12:30", "17:00"]
-techtalk_time = "13:25"
-break_time = ["11:00", "15:00"]
-lunch_time = ["12:30"]
-
-# List of birthdays (user ID and birthday date)
-birthdays = {
-    Ali: "2025-05-25",
-    Mehdi: "2025-10-21"
-}
+# Sharding: SHARD_COUNT shards in total, this instance runs SHARD_IDS (all of them if unset)
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+SHARD_IDS = os.getenv("SHARD_IDS")
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents, shard_count=int(SHARD_COUNT),
+        shard_ids=[int(shard_id) for shard_id in SHARD_IDS.split(",")] if SHARD_IDS else None,
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
+
+# Check-in, check-out, break, lunch and tech-talk times, workdays and holidays
+SCHEDULE_FILE = os.getenv("SCHEDULE_FILE", "schedule.json")
+daily_schedule = load_schedule(SCHEDULE_FILE)
+# Event types used for the "next event" countdowns
+COUNTDOWN_EVENTS = ["CHECK-IN", "CHECK-OUT", "BREAKTIME", "LUNCHTIME"]
+scheduler = AsyncIOScheduler(timezone=daily_schedule.timezone)
+
+# Cohorts (channel, role, Moodle link) receiving the scheduled reminders
+COHORTS_FILE = os.getenv("COHORTS_FILE", "cohorts.json")
+cohorts = load_cohorts(COHORTS_FILE)
+# Every outbound message goes through one priority queue (reminders first)
+outbound = OutboundDispatcher()
+broadcast_engine = BroadcastEngine(bot, cohorts, outbound)
+
+# Hot-path metrics, scraped on /metrics and summarized by /botstats
+messages_processed = metrics.counter("discord_messages_processed_total", "Messages received (bot's own excluded).")
+local_answers = metrics.counter("intent_local_answers_total", "Mentions answered locally, by intent.")
+scheduler_lag = metrics.histogram("scheduler_job_lag_seconds", "Delay between a reminder's scheduled time and its run.")
+metrics.gauge("response_cache_hit_ratio", "Response cache hit ratio.", lambda: response_cache.stats()["hit_rate"])
+metrics.gauge("response_cache_hits", "Response cache hits.", lambda: response_cache.hits)
+if LLM_WORKERS:
+    metrics.gauge("llm_pool_jobs_pending", "Conversation jobs waiting for an LLM worker.", conversations.pending)
+else:
+    metrics.gauge("chat_sessions_resident", "Gemini chat sessions kept in memory.", lambda: len(conversations.chats))
+metrics.gauge("outbound_queue_depth", "Outbound jobs waiting, by priority.",
+              lambda: {(("priority", str(p)),): depth for p, depth in outbound.stats()["depth"].items()})
+metrics.gauge("leader", "1 if this instance runs the scheduled jobs.", lambda: int(leader_lease.is_leader))
+metrics.gauge("outbound_shed", "Droppable outbound edits shed under load.", lambda: outbound.shed)
+metrics.gauge("mentions_coalesced", "Mentions merged into an earlier pending prompt.", lambda: mention_coalescer.coalesced)
+
+def moodle_link_for(channel_id):
+    for cohort in cohorts:
+        if cohort["channel_id"] == channel_id:
+            return cohort["moodle_link"]
+    return cohorts[0]["moodle_link"] if cohorts else ""
+
+# Birthdays and announcements (yearly or one-off), sent once a day at send_at
+EVENTS_FILE = os.getenv("EVENTS_FILE", "events.json")
+recurring_events = load_recurring_events(EVENTS_FILE)
+event_sender = RecurringEventSender(bot, outbound, recurring_events, state=chat_db)
 
 async def send_scheduled_message(time_str):
+    now = daily_schedule.now()
+    hour, minute = time_str.split(":")
+    scheduled_at = daily_schedule.timezone.localize(datetime.combine(now.date(), dt_time(int(hour), int(minute))))
+    scheduler_lag.observe(max((now - scheduled_at).total_seconds(), 0.0))
 
-    if datetime.now(pytz.timezone('Europe/Brussels')).weekday() >= 5:
-        logging.info("😴 Week-end detected, no message sent.")
+    if not daily_schedule.is_workday(daily_schedule.now().date()):
+        logging.info("😴 Week-end or holiday detected, no message sent.")
         return
 
     logging.info(f"Trying to send scheduled message at {time_str}")
-    
-    channels_config = {
-        #CHANNEL_ID_WEBDEV: {"role_name": "Hamilton 10", "moodle_link": "https://moodle.becode.org/mod/attendance/view.php?id=1217"},
-        CHANNEL_ID_AI: {"role_name": "Thomas5", "moodle_link": "https://moodle.becode.org/mod/attendance/view.php?id=1433"}
-    }
-
-    channels_test_config = {
-        CHANNEL_TEST_ID: {"role_name": "prout", "moodle_link": "https://mehdi-godefroid.com" }
-    }
-    
+
     # Message config
+    event_types = daily_schedule.types_at(time_str)
+    traffic.scheduled(time_str, event_types)
     message_template = ""
-    if time_str in checkin_times:
+    if "CHECK-IN" in event_types:
         message_template = "🤖 {role} bip boup bip boup CHECK-IN 🤖 \nMoodle link : {link}"
 
-        if time_str in lunch_time:
-            message_template += "\n 🤖 It's LUNCH-TIME 🌯 🤖"
-
-    elif time_str in checkout_times:
+    elif "CHECK-OUT" in event_types:
         message_template = "🤖 {role} bip boup bip boup CHECK-OUT 🤖 \nMoodle link : {link}"
 
-    elif time_str in break_time:
+    elif "BREAKTIME" in event_types:
         message_template = "🤖 {role} bip boup bip boup BREAK-TIME ☕️☕️ 🤖"
-        
-    #else:
-        #message_template = "🤖 {role} It's working! 🤖"
-    
-    # Config channel
-    for channel_id, config in channels_config.items():
-        try:
-            channel = bot.get_channel(channel_id)
-            if not channel:
-                logging.error(f"❌ Channel with ID {channel_id} not found.")
-                continue
-                
-            # get rOle
-            role = discord.utils.get(channel.guild.roles, name=config["role_name"]) if channel.guild else None
-            role_mention = role.mention if role else ""
-            if not role:
-                logging.warning(f"Role not found in {channel.name}")
-            
-            # Format
-            message = message_template.format(role=role_mention, link=config["moodle_link"])
-            if message:
-                logging.info("message empty")
-            else:
-                message = ""
-            if channel_id == CHANNEL_ID_AI and time_str in techtalk_time:
-                 techTalkMessage = get_techtalk_message_if_today(json_keyfile_path, sheet_url)
-                 logging.info(techTalkMessage)
-                 message += techTalkMessage
-            await channel.send(message)
-            logging.info(f"✅ Message sent to {channel.name} ({channel.id})")
-            
-        except Exception as e:
-            logging.error(f"❌ Error sending message to channel {channel_id}: {e}")
-
-# Function to check birthdays and send messages
-@tasks.loop(hours=24)
-async def check_birthday():
-    current_time = datetime.now(pytz.timezone('Europe/Brussels'))
-    current_date = current_time.strftime("%Y-%m-%d")
-    
-    # Loop through birthdays and check if today is the day
-    for user_id, birthday in birthdays.items():
-        if current_date == birthday:
-            user = await bot.fetch_user(user_id)
-            await user.send(f"🎉 Happy Birthday {user.name}! 🎂")
-            logging.info(f"Sent birthday wish to {user.name}!")
+
+    if "LUNCHTIME" in event_types:
+        message_template += "\n 🤖 It's LUNCH-TIME 🌯 🤖"
+
+    techTalkMessage = techtalk_index.today_message() if "TECHTALK" in event_types else ""
+    if techTalkMessage:
+        logging.info(techTalkMessage)
+
+    def render(cohort, role_mention):
+        message = message_template.format(role=role_mention, link=cohort["moodle_link"])
+        if cohort.get("techtalk"):
+            message += techTalkMessage
+        return message
+
+    await broadcast_engine.broadcast(render)
 
 # Slash command /time to display the current time
 @bot.tree.command(name="time", description="Displays the current time")
@@ -223,123 +186,261 @@ async def time(interaction: discord.Interaction):
     current_time = datetime.now(pytz.timezone('Europe/Brussels')).strftime("%H:%M:%S")
     await interaction.response.send_message(f"The current time is {current_time}.")
 
-# Function to calculate the time remaining until the next check-in or check-out
-def time_until_next_event():
-    current_time = datetime.now(pytz.timezone('Europe/Brussels'))
-
-    # List of events with their types
-    all_times = [(time_str, "CHECK-IN") for time_str in checkin_times] + \
-                [(time_str, "CHECK-OUT") for time_str in checkout_times] + \
-                [(time_str, "BREAKTIME") for time_str in break_time] + \
-                [(time_str, "LUNCHTIME") for time_str in lunch_time]
-
-    events = []
-
-    # Convert event times to datetime objects
-    for event_time_str, event_type in all_times:
-        event_hour, event_minute = map(int, event_time_str.split(":"))
-        event_time_obj = current_time.replace(hour=event_hour, minute=event_minute, second=0, microsecond=0)
-        events.append((event_time_obj, event_type))
-
-    # Sort events by ascending time
-    events.sort()
-
-    # Find the next event
-    next_event_time, event_type = None, None
-    for event_time_obj, event_type in events:
-        if current_time < event_time_obj:
-            next_event_time = event_time_obj
-            break
-
-    if next_event_time is None:
-        return "🤖 END OF THE DAY! 🍻"
-
-    # Calculate the remaining time until the event
-    time_remaining = next_event_time - current_time
-    hours_remaining = time_remaining.seconds // 3600
-    minutes_remaining = (time_remaining.seconds // 60) % 60
-
-    # If the current time is before 9am, special message
-    if current_time.hour < 9:
-        return f"🤖 Take a good coffee, work day will start in {hours_remaining}h {minutes_remaining}min ☕️"
-
-    # If the current time is after 5pm
-    if current_time.hour >= 17:
-        return "🤖 Stop playing with me, working time is over 🍻🍻"
-
-    # Return the message with the next event
-    return f"🤖 Next {event_type} in {hours_remaining}h {minutes_remaining}min"
-
+def format_duration(delta):
+    total_minutes = int(delta.total_seconds() // 60)
+    days, minutes = divmod(total_minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{days}d {hours}h {minutes}min" if days else f"{hours}h {minutes}min"
 
+# Function to calculate the time remaining until the next check-in or check-out
+# event_types: only consider these types, e.g. ["CHECK-IN"] (default: COUNTDOWN_EVENTS)
+def time_until_next_event(event_types=None):
+    current_time = daily_schedule.now()
+    next_event = daily_schedule.next_event(current_time, event_types or COUNTDOWN_EVENTS)
+    if next_event is None:
+        return "🤖 Nothing scheduled anymore, enjoy! 🍻"
+    next_event_time, event_type = next_event
+    time_remaining = format_duration(next_event_time - current_time)
+
+    if next_event_time.date() == current_time.date():
+        # Before the first event of the day, special message
+        first_event = daily_schedule.first_event_today(current_time)
+        if first_event and current_time < first_event:
+            return f"🤖 Take a good coffee, work day will start in {time_remaining} ☕️"
+        return f"🤖 Next {event_type} in {time_remaining}"
+
+    when = next_event_time.strftime("%A at %H:%M")
+    if daily_schedule.is_workday(current_time.date()):
+        return f"🤖 END OF THE DAY! 🍻 Stop playing with me, working time is over. Next {event_type} on {when} (in {time_remaining})"
+    return f"🤖 No class today 😴 Next {event_type} on {when} (in {time_remaining})"
+
+
+# Le salon de test n'est dans le cache que si sa guilde est sur un shard de cette instance :
+# sinon on y envoie directement par l'API REST
+def get_channel_test():
+    return bot.get_channel(CHANNEL_TEST_ID) or bot.get_partial_messageable(CHANNEL_TEST_ID)
+
+# Private messages are forwarded to the test channel in batches
+async def forward_private_messages(lines):
+    channel_test = get_channel_test()
+    digest = f"🤖 <@{Mehdi}> <@{Robin}> <@{Elsa}> {len(lines)} private message(s) received:\n" + "\n".join(lines)
+    for chunk in split_message(digest):
+        await outbound.send(channel_test, chunk, ADMIN)
+
+dm_digest = DMDigest(forward_private_messages)
+
+# Buffered private messages are forwarded before the connection closes (Ctrl-C, SIGTERM, shutdown_bot):
+# bot.run() and shutdown_bot() both end with bot.close()
+close_connection = bot.close
+
+async def close_bot():
+    try:
+        await asyncio.wait_for(dm_digest.flush(), timeout=10)
+    except asyncio.TimeoutError:
+        logging.error("❌ Private messages not forwarded before shutdown (timeout)")
+    await close_connection()
+
+bot.close = close_bot
+
+# Questions answered locally, without calling Gemini
+intent_router = IntentRouter()
+
+@intent_router.intent(
+    "time",
+    r"what time is it(?: now| in belgium)?",
+    r"what(?:'s| is) the (?:current )?time(?: now)?",
+    r"(?:the )?(?:current )?time(?: now)?",
+    r"do you have the time",
+)
+def answer_time(message, slots):
+    current_time = datetime.now(pytz.timezone('Europe/Brussels')).strftime("%H:%M:%S")
+    return f"Hello {message.author.mention}, the current time is {current_time}. 🤖\n{time_until_next_event()}"
+
+EVENT_SLOTS = {"in": "CHECK-IN", "out": "CHECK-OUT", "break": "BREAKTIME", "pause": "BREAKTIME", "lunch": "LUNCHTIME"}
+
+EVENT_WORDS = r"(?:check[- ]?(?:in|out)|break|pause|lunch)"
+
+@intent_router.intent(
+    "next_event",
+    rf"(?:the )?next (?:{EVENT_WORDS}|event)",
+    rf"when(?:'s| is| do we have| do we| does)? (?:the )?(?:next )?{EVENT_WORDS}(?: today)?(?: start| begin)?",
+    rf"how (?:long|much time)(?: is it| do we have| left)? (?:until|till|before) (?:the )?(?:next )?{EVENT_WORDS}",
+    r"(?:is it )?(?:break|lunch)[- ]?time(?: yet)?",
+    slots=r"check[- ]?(?P<check>in|out)|(?P<other>break|pause|lunch)",
+)
+def answer_next_event(message, slots):
+    if "check" in slots:
+        event_types = [EVENT_SLOTS[slots["check"].lower()]]
+    elif "other" in slots:
+        event_types = [EVENT_SLOTS[slots["other"].lower()]]
+    else:
+        event_types = None
+    return time_until_next_event(event_types)
+
+@intent_router.intent(
+    "moodle",
+    r"(?:(?:what|where)(?:'s| is) )?(?:the )?(?:moodle|attendance|check[- ]?in|check[- ]?out) (?:link|url)",
+    r"(?:the )?(?:link|url) (?:to|for) (?:the )?(?:moodle|check[- ]?in|check[- ]?out|attendance)",
+    r"where (?:do i|to|can i|should i) check[- ]?(?:in|out)(?: today)?",
+)
+def answer_moodle(message, slots):
+    return f"🤖 Moodle check-in/check-out link: {moodle_link_for(message.channel.id)}"
+
+@intent_router.intent(
+    "techtalk",
+    r"(?:what(?:'s| is) |who(?:'s| is) (?:doing |presenting )?)?(?:today'?s?|the next|next) tech[- ]?talks?",
+    r"(?:what(?:'s| is) )?(?:the )?tech[- ]?talks? (?:of |for )?today",
+    r"who(?:'s| is) (?:presenting|doing (?:the |today'?s? )?tech[- ]?talk)(?: today)?",
+    r"is there a tech[- ]?talk today",
+)
+def answer_techtalk(message, slots):
+    return techtalk_index.today_message().strip() or "🤖 No tech-talk scheduled today."
+
+
+# Mentions that no local intent could answer
+async def start_reply(message):
+    # Streaming: placeholder as soon as the (first) mention arrives, sent while Gemini is already
+    # called and edited as the chunks arrive (skipped when the channel is rate limited: only the final
+    # answer is queued then)
+    reply_stream = StreamingReply(message.channel, outbound)
+    if GEMINI_STREAMING:
+        await reply_stream.start()
+    return reply_stream
+
+async def answer_with_gemini(message, prompt, reply_stream=None):
+    reply_stream = reply_stream or await start_reply(message)
+    message_lower = prompt.lower()
+    cache_key = None
+    if any(keyword in message_lower for keyword in ["tech-talk", "tech talk"]):
+        techTalkMessage = techtalk_index.today_message()
+        logging.info(techTalkMessage)
+        prompt += f"Also, the use is asking about Tech talk so This is the tech talk scheduled today: {techTalkMessage}. Can you summarize or comment on it?"
+    elif RESPONSE_CACHE_ENABLED:
+        cache_key = response_cache.key_for(prompt, chat_db.last_message_at(message.author.id))
+        cached_reply = response_cache.get(cache_key) if cache_key else None
+        if cached_reply:
+            logging.info(f"💾 Cached reply for {message.author} ({response_cache.stats()})")
+            conversations.remember(message.author.id, prompt, cached_reply)
+            await reply_stream.finish(cached_reply)
+            return
+    try:
+        # A reply that goes to the cache must not come from this learner's history or summary: it is
+        # asked in a standalone session, like the cached replies it will be served with
+        standalone = cache_key is not None
+        if GEMINI_STREAMING:
+            reply = await conversations.ask(message.author.id, prompt, on_chunk=reply_stream.update, standalone=standalone)
+        else:
+            reply = await conversations.ask(message.author.id, prompt, standalone=standalone)
+        if cache_key:
+            response_cache.put(cache_key, reply)
+    except asyncio.TimeoutError:
+        logging.error(f"Timeout Gemini pour {message.author}")
+        reply = "⚠️ Gemini met trop de temps à répondre, réessaie dans un instant."
+    except Exception as e:
+        logging.error(f"Erreur Gemini : {e}")
+        reply = "⚠️ Une erreur s'est produite avec Gemini."
+    await reply_stream.finish(reply)
+
+
+# Quick successive mentions of one user become a single Gemini request; the placeholder does not wait
+mention_coalescer = MentionCoalescer(answer_with_gemini, on_first=start_reply)
+
+def record_traffic(message):
+    if isinstance(message.channel, discord.DMChannel):
+        traffic.message(message, "dm")
+    elif bot.user.mentioned_in(message):
+        intent = intent_router.match(message.content)
+        traffic.message(message, "mention", intent=intent[0] if intent else None, history=chat_db.count(message.author.id))
+    else:
+        traffic.message(message, "message")
 
 # Event to listen if mentioned 
 @bot.event
 async def on_message(message):
 
+    if message.author != bot.user:
+        messages_processed.inc()
+        if traffic.enabled:
+            record_traffic(message)
+
     # Check if the message is from a DM and isn't sent by the bot itself
     if isinstance(message.channel, discord.DMChannel) and message.author != bot.user:
         logging.info(f"Private message received from {message.author}: {message.content}")
-        channel_test = bot.get_channel(CHANNEL_TEST_ID)
-        if channel_test:
-            await channel_test.send(f"🤖 <@{Mehdi}> <@{Robin}> <@{Elsa}> Private message received from {message.author}: {message.content}")  # Mentionner l'utilisateur avec son ID
-        else:
-            logging.error("Le canal spécifié n'a pas été trouvé (pour test).")
-        # Reply with the current time
-        current_time = datetime.now(pytz.timezone('Europe/Brussels')).strftime("%H:%M:%S")
-        await message.reply(f"The current time is {current_time}.")
+        dm_digest.add(message.author, message.content)
 
-        # Reply with the time remaining until the next check-in or check-out
-        time_remaining_message = time_until_next_event()
-        await message.reply(time_remaining_message)
+        # Reply with the current time and the time remaining until the next check-in or check-out
+        current_time = datetime.now(pytz.timezone('Europe/Brussels')).strftime("%H:%M:%S")
+        await outbound.reply(message, f"The current time is {current_time}.\n{time_until_next_event()}")
 
     # Check if the bot is mentioned in the message (in any channel, not just DMs)
     if bot.user.mentioned_in(message) and message.author != bot.user:
         #if message.channel.id == CHANNEL_TEST_ID:
             prompt = message.content
-            message_lower = prompt.lower()
             logging.info(f"Bot mentioned by {message.author} in {message.channel}: {message.content}")
-            if any(keyword in message_lower for keyword in ["what time", "time"]):
-                # Send a custom reply when the bot is mentioned
-                current_time = datetime.now(pytz.timezone('Europe/Brussels')).strftime("%H:%M:%S")
-                await message.channel.send(f"Hello {message.author.mention}, the current time is {current_time}. 🤖")
-                time_remaining_message = time_until_next_event()
-                await message.channel.send(time_remaining_message)
-            if any(keyword in message_lower for keyword in ["tech-talk", "tech talk"]):
-                techTalkMessage = get_techtalk_message_if_today(json_keyfile_path, sheet_url)
-                logging.info(techTalkMessage)
-                chat = get_chat_for_user(message.author.id)
-                prompt += f"Also, the use is asking about Tech talk so This is the tech talk scheduled today: {techTalkMessage}. Can you summarize or comment on it?"
-                response = chat.send_message(prompt)
-                await message.channel.send(response.text)
+            intent = intent_router.match(prompt)
+            if intent:
+                name, handler, slots = intent
+                logging.info(f"🎯 Intent {name} {slots} answered locally")
+                local_answers.inc(intent=name)
+                await outbound.send(message.channel, handler(message, slots))
             else:
-                try:
-                    chat = get_chat_for_user(message.author.id)
-                    response = chat.send_message(prompt)
-                    reply = response.text
-                except Exception as e:
-                    logging.error(f"Erreur Gemini : {e}")
-                    reply = "⚠️ Une erreur s'est produite avec Gemini."
-                await message.channel.send(reply)
+                await mention_coalescer.submit(message, prompt)
 
     # Always let the bot handle commands with `on_message`
     await bot.process_commands(message)
 
+async def sync_commands_if_changed():
+    # Syncing is rate limited by Discord: only push the slash commands when their definitions changed
+    definitions = json.dumps([command.to_dict(bot.tree) for command in bot.tree.get_commands()], sort_keys=True)
+    digest = hashlib.sha256(f"{bot.application_id}:{definitions}".encode()).hexdigest()
+    if chat_db.get_meta("commands_hash") == digest:
+        logging.info("Slash commands unchanged, sync skipped")
+        return False
+    await bot.tree.sync()
+    chat_db.set_meta("commands_hash", digest)
+    logging.info("Slash commands are synced!")
+    return True
+
+startup_done = False
+
+async def send_status_message():
+    try:
+        await outbound.send(get_channel_test(), f"🤖 Yeah I'm still workin' no worries 🤖", ADMIN)  # Mentionner l'utilisateur avec son ID
+    except Exception as e:
+        logging.error(f"❌ Could not send the status message: {e}")
+
 # Event when the bot is ready
 @bot.event
 async def on_ready():
+    global startup_done
+    # Channel and role objects are rebuilt on reconnect
+    broadcast_engine.clear_cache()
+    # discord.py fires on_ready again after every reconnect: the setup below runs until it has
+    # succeeded once (every step is safe to run again if a previous attempt failed halfway)
+    if startup_done:
+        logging.info(f'Bot reconnected as {bot.user}')
+        return
+    metrics.startup.mark("gateway")
     logging.info(f'Bot connected as {bot.user}')
-    channel_test = bot.get_channel(CHANNEL_TEST_ID)
-    if channel_test:
-        await channel_test.send(f"🤖 Yeah I'm still workin' no worries 🤖")  # Mentionner l'utilisateur avec son ID
-    else:
-        logging.error("Le canal spécifié n'a pas été trouvé (pour test).")
-    
+    # Best effort, in the background: a failing status message must not keep the reminders from being scheduled
+    asyncio.create_task(send_status_message())
+
+    # Pre-warm the tech-talk index and keep it refreshed in the background
+    techtalk_index.start()
+    # Event-loop lag sampler and the local Prometheus endpoint
+    metrics.start()
+
+    # Every instance schedules the jobs; they only run on the leader
+    await leader_lease.acquire()
+    leader_lease.start()
+
     # Schedule messages using cron-style scheduling
-    for time_str in ["08:55", "11:00", "12:30", "13:25", "15:00", "17:00"]:
+    for time_str in daily_schedule.times():
         hour, minute = time_str.split(":")
         scheduler.add_job(
-            send_scheduled_message,
+            leader_only(leader_lease, send_scheduled_message),
             'cron',
+            day_of_week=daily_schedule.cron_day_of_week(),
             hour=hour,
             minute=minute,
             args=[time_str],
@@ -347,48 +448,64 @@ async def on_ready():
             replace_existing=True
         )
     
-    scheduler.start()
-    await bot.tree.sync()
-    logging.info("Slash commands are synced!")
-    
-    #check_birthday.start()
+    hour, minute = recurring_events.send_at.split(":")
+    scheduler.add_job(leader_only(leader_lease, event_sender.run_today), 'cron', hour=hour, minute=minute, timezone=recurring_events.timezone,
+                      id="recurring_events", replace_existing=True)
+    if not scheduler.running:
+        scheduler.start()
+    # Started after send_at (restart, deploy): today's events have not been sent yet
+    if event_sender.is_past_send_time():
+        asyncio.create_task(leader_only(leader_lease, event_sender.run_today)())
+    metrics.startup.mark("scheduler")
+    await sync_commands_if_changed()
+    metrics.startup.mark("command_sync")
+    logging.info(f"🚀 Startup in {metrics.uptime_seconds():.2f}s: {metrics.startup.breakdown()}")
+    startup_done = True
+
+    # Load Gemini in a thread now, so the first mention doesn't pay for the import (workers load their own)
+    if not LLM_WORKERS:
+        asyncio.create_task(asyncio.to_thread(gemini_models.get, "chat"))
+
+def format_seconds(value):
+    return "n/a" if value is None else f"{value * 1000:.0f} ms"
+
+@bot.tree.command(name="botstats", description="Get some basic bot statistics")
+async def botstats(interaction: discord.Interaction):
+    gemini = metrics.get("llm_pool_request_seconds" if LLM_WORKERS else "gemini_request_seconds")
+    ttft = metrics.get("gemini_time_to_first_token_seconds")
+    sheets = metrics.get("sheets_fetch_seconds")
+    sends = metrics.get("discord_send_seconds")
+    cache = response_cache.stats()
+    queue = outbound.stats()
+    lines = [
+        f"⏱️ Uptime: {format_duration(timedelta(seconds=int(metrics.uptime_seconds())))}",
+        f"💬 Messages processed: {int(messages_processed.value())} ({int(local_answers.value())} answered locally)",
+        f"🤖 Gemini: {gemini.count} calls, p50 {format_seconds(gemini.quantile(0.5))}, p95 {format_seconds(gemini.quantile(0.95))}, first token p50 {format_seconds(ttft.quantile(0.5))}",
+        f"📄 Sheets: {sheets.count} fetches, p50 {format_seconds(sheets.quantile(0.5))}",
+        f"📨 Discord sends: {sends.count}, p50 {format_seconds(sends.quantile(0.5))}, queue wait p95 {format_seconds(queue['wait_p95'])}, depth {sum(queue['depth'].values())}",
+        f"📅 Scheduler lag max: {format_seconds(scheduler_lag.quantile(1.0))}",
+        f"🌀 Event loop lag p95: {format_seconds(metrics.loop_lag.quantile(0.95))}",
+        f"💾 Cache hit rate: {cache['hit_rate']:.0%} ({cache['hits']} hits)",
+        f"❌ Errors: {int(metrics.errors.value())}",
+    ]
+    await interaction.response.send_message("\n".join(lines))
 
 def main():
-    #load_user_chats()
+    metrics.startup.mark("setup")
+    load_user_chats()
+    metrics.startup.mark("chat_history")
+    if LLM_WORKERS:
+        # Forked before the event loop and its threads exist
+        conversations.start()
+        metrics.startup.mark("llm_workers")
     #signal.signal(signal.SIGINT, lambda *args: asyncio.create_task(handle_exit_signal(*args)))
     #signal.signal(signal.SIGTERM, lambda *args: asyncio.create_task(handle_exit_signal(*args)))
-    bot.run(TOKEN)  # Start the bot
+    try:
+        bot.run(TOKEN)  # Start the bot
+    finally:
+        leader_lease.release()
+        if LLM_WORKERS:
+            conversations.stop()
 
 if __name__ == "__main__":
     main()
-# Triggering GitHub actions demonstration
-
-# --- NEW ADDITIONS FOR DEMONSTRATION ---
-class StatisticsHelper:
-    def __init__(self, start_time):
-        self.start_time = start_time
-        self.processed_messages = 0
-        
-    def get_uptime_seconds(self):
-        # A code reviewer action might notice this can return negative if start_time is in the future
-        # or suggest using datetime.now(timezone.utc) consistently
-        now = datetime.now()
-        diff = now - self.start_time
-        return diff.total_seconds()
-
-    def record_message(self, message_content):
-        # A simple code smell for the bot to complain about: hardcoded string
-        if "test" in message_content.lower():
-            logging.info("A test message was detected!")
-        self.processed_messages += 1
-
-bot_stats = StatisticsHelper(datetime.now())
-
-@bot.tree.command(name="botstats", description="Get some basic bot statistics")
-async def botstats(interaction: discord.Interaction):
-    uptime = bot_stats.get_uptime_seconds()
-    messages = bot_stats.processed_messages
-    
-    # Missing type hints, lacking f-string best practices, maybe an unhandled exception risk
-    response_text = "Bot has been running for " + str(uptime) + " seconds and processed " + str(messages) + " messages."
-    await interaction.response.send_message(response_text)
@@ -0,0 +1,61 @@
+import os
+import time
+import asyncio
+import logging
+
+
+# Les mentions d'un même utilisateur arrivées à moins de WINDOW s d'intervalle partent en une seule requête
+MENTION_COALESCE_WINDOW = float(os.getenv("MENTION_COALESCE_WINDOW", "1.5"))
+MENTION_COALESCE_MAX_WAIT = float(os.getenv("MENTION_COALESCE_MAX_WAIT", "5"))
+
+
+class MentionCoalescer:
+    # Debounces mentions per (user, channel): handle(message, prompt, started) is called once, window
+    # seconds after the user's last mention (or max_wait seconds after the first one), with the prompts
+    # joined and the last message to reply to. window=0 calls handle right away.
+    # on_first(message), if given, is awaited as soon as the first mention arrives (e.g. to show a
+    # placeholder, so only the work behind it waits for the window); its result is passed as `started`.
+
+    def __init__(self, handle, window=MENTION_COALESCE_WINDOW, max_wait=MENTION_COALESCE_MAX_WAIT, on_first=None):
+        self._handle = handle  # async (message, prompt, started) -> None
+        self._on_first = on_first
+        self.window = window
+        self.max_wait = max_wait
+        self._pending = {}  # (user_id, channel_id) -> {"messages", "prompts", "first", "last"}
+        self.coalesced = 0
+
+    async def submit(self, message, prompt):
+        if self.window <= 0:
+            await self._handle(message, prompt, await self._started(message))
+            return
+        key = (message.author.id, message.channel.id)
+        now = time.monotonic()
+        pending = self._pending.get(key)
+        if pending:
+            pending["messages"].append(message)
+            pending["prompts"].append(prompt)
+            pending["last"] = now
+            self.coalesced += 1
+            return
+        pending = self._pending[key] = {"messages": [message], "prompts": [prompt], "first": now, "last": now}
+        asyncio.create_task(self._fire_when_quiet(key))
+        pending["started"] = await self._started(message)
+
+    async def _started(self, message):
+        return await self._on_first(message) if self._on_first else None
+
+    async def _fire_when_quiet(self, key):
+        pending = self._pending[key]
+        while True:
+            deadline = min(pending["last"] + self.window, pending["first"] + self.max_wait)
+            delay = deadline - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        del self._pending[key]
+        if len(pending["prompts"]) > 1:
+            logging.info(f"🧺 {len(pending['prompts'])} mentions from {pending['messages'][-1].author} sent as one prompt")
+        try:
+            await self._handle(pending["messages"][-1], "\n".join(pending["prompts"]), pending.get("started"))
+        except Exception as e:
+            logging.error(f"❌ Error answering mentions of {pending['messages'][-1].author}: {e}")
@@ -0,0 +1,229 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+
+# Endpoint Prometheus local (0 pour le désactiver)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = {}
+STARTED_AT = time.monotonic()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        if labels:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+        return sum(self._values.values())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    # Value read from a callback at scrape time; fn may return a number or {labels_dict_items: value}
+    def __init__(self, name, help_text, fn):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.fn()
+        except Exception as e:
+            logging.warning(f"Gauge {self.name} failed: {e}")
+            return lines
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {v}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Histogram:
+    # Prometheus-style cumulative buckets, plus the last samples for quantiles in /botstats
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=1024)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self._recent.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self._counts[i] += 1
+                break
+
+    def time(self):
+        # with histogram.time(): ...
+        return _Timer(self)
+
+    def quantile(self, q):
+        if not self._recent:
+            return None
+        samples = sorted(self._recent)
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self._counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+def _register(metric):
+    # Same name -> same metric, so modules can declare what they use at import time
+    return _registry.setdefault(metric.name, metric)
+
+
+def counter(name, help_text):
+    return _register(Counter(name, help_text))
+
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help_text, buckets))
+
+
+def gauge(name, help_text, fn):
+    _registry[name] = Gauge(name, help_text, fn)
+    return _registry[name]
+
+
+def get(name):
+    return _registry.get(name)
+
+
+def uptime_seconds():
+    return time.monotonic() - STARTED_AT
+
+
+gauge("bot_uptime_seconds", "Seconds since the bot process started.", uptime_seconds)
+errors = counter("bot_errors_total", "Errors by source.")
+loop_lag = histogram(
+    "event_loop_lag_seconds", "Delay of the asyncio event loop when waking up a sleeping task.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+
+class StepTimer:
+    # Durations of one-off phases (startup steps), logged as a breakdown and exported as a gauge
+    def __init__(self):
+        self.steps = {}
+        self._last = time.monotonic()
+
+    def mark(self, name):
+        # Records the time elapsed since the previous mark (or since this module was imported)
+        now = time.monotonic()
+        self.record(name, now - self._last)
+        self._last = now
+
+    @contextmanager
+    def step(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.steps[name] = self.steps.get(name, 0.0) + seconds
+
+    def breakdown(self):
+        return ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.steps.items())
+
+
+startup = StepTimer()
+gauge("startup_step_seconds", "Duration of each startup step.",
+      lambda: {(("step", name),): seconds for name, seconds in startup.steps.items()})
+
+
+def render_prometheus():
+    lines = []
+    for metric in _registry.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def _sample_loop_lag(interval):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(time.perf_counter() - started - interval, 0.0))
+
+
+_background = {}
+
+def start(port=METRICS_PORT, host=METRICS_HOST, lag_interval=0.5):
+    # Starts the event-loop lag sampler and the /metrics HTTP endpoint, once
+    if "lag" not in _background:
+        _background["lag"] = asyncio.create_task(_sample_loop_lag(lag_interval))
+    if port and "http" not in _background:
+        _background["http"] = asyncio.create_task(_serve(host, port))
+
+
+async def _serve(host, port):
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logging.error(f"❌ Could not start metrics endpoint on {host}:{port}: {e}")
+        return
+    logging.info(f"📈 Metrics available on http://{host}:{port}/metrics")
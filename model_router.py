@@ -0,0 +1,207 @@
+import os
+import time
+import asyncio
+import logging
+import metrics
+from gemini_dispatcher import call_chat
+
+
+# Sans réponse (ou premier chunk) du modèle principal après son p95 observé, on lance la même requête
+# sur le modèle de secours et on garde la première réponse
+GEMINI_HEDGE_DELAY = float(os.getenv("GEMINI_HEDGE_DELAY", "5"))          # until enough samples
+GEMINI_HEDGE_MIN_DELAY = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "1"))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+# Disjoncteur : après N échecs d'affilée, le modèle est évité pendant RESET secondes
+GEMINI_CIRCUIT_FAILURES = int(os.getenv("GEMINI_CIRCUIT_FAILURES", "5"))
+GEMINI_CIRCUIT_RESET_SECONDS = float(os.getenv("GEMINI_CIRCUIT_RESET_SECONDS", "60"))
+
+hedges = metrics.counter("gemini_hedges_total", "Hedged Gemini requests, by the model that answered first.")
+
+
+class CircuitBreaker:
+    # closed: calls go through. After `failures` failures in a row it opens: calls are refused for
+    # reset_seconds, then one trial call is let through (half-open); its success closes the breaker,
+    # its failure opens it again.
+
+    def __init__(self, name, failures=GEMINI_CIRCUIT_FAILURES, reset_seconds=GEMINI_CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        if self._opened_at is None:
+            return True
+        if time.monotonic() - self._opened_at < self.reset_seconds or self._trial:
+            return False
+        self._trial = True
+        return True
+
+    def success(self):
+        if self._opened_at is not None:
+            logging.info(f"✅ Gemini model {self.name} is back, circuit closed")
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+
+    def failure(self):
+        self._consecutive += 1
+        if self._trial or (self._opened_at is None and self._consecutive >= self.failures):
+            logging.warning(f"⚡ Gemini model {self.name} failing ({self._consecutive} in a row), circuit open")
+            self._opened_at = time.monotonic()
+        self._trial = False
+
+
+class _Superseded(Exception):
+    pass
+
+
+class _Race:
+    # Which attempt of a hedged turn is shown: the first one to produce output
+    def __init__(self):
+        self.winner = None
+        self.tasks = {}
+
+    def claim(self, name):
+        if self.winner is None:
+            self.winner = name
+            for other, task in self.tasks.items():
+                if other != name:
+                    task.cancel()
+        return self.winner == name
+
+    def lost(self, name):
+        return self.winner is not None and self.winner != name
+
+
+class ModelRouter:
+    # Sends a chat turn to the primary model and, when it is slower than its own p95 to start answering,
+    # hedges on the fallback model with the same history; whichever starts answering first wins and
+    # the other call is cancelled. When the primary model's circuit is open, turns go straight to the
+    # fallback. Latency (time to first chunk, or to the reply without streaming) is tracked per model.
+    # get_model(name) returns the models; sessions on the fallback are built from the primary
+    # session's history, which is updated with the fallback's turn when it wins.
+
+    def __init__(self, get_model, primary="chat", fallback="fallback", labels=None,
+                 hedge_delay=GEMINI_HEDGE_DELAY, min_delay=GEMINI_HEDGE_MIN_DELAY, min_samples=GEMINI_HEDGE_MIN_SAMPLES):
+        self._get_model = get_model
+        self.primary = primary
+        self.fallback = fallback
+        self.labels = labels or {primary: primary, fallback: fallback}
+        self.default_delay = hedge_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.breakers = {name: CircuitBreaker(self.labels[name]) for name in (primary, fallback)}
+        self.latency = {
+            name: metrics.Histogram(f"gemini_first_token_seconds_{name}", f"First token latency of {self.labels[name]}")
+            for name in (primary, fallback)
+        }
+        metrics.gauge("gemini_model_p95_seconds", "Observed p95 time to first token, per model.",
+                      lambda: {(("model", self.labels[n]),): self.p95(n) or 0 for n in (primary, fallback)})
+        metrics.gauge("gemini_circuit_open", "1 while a model's circuit breaker is open.",
+                      lambda: {(("model", self.labels[n]),): int(self.breakers[n].is_open) for n in (primary, fallback)})
+
+    def p95(self, name):
+        return self.latency[name].quantile(0.95) if self.latency[name].count >= self.min_samples else None
+
+    def hedge_delay(self):
+        p95 = self.p95(self.primary)
+        return self.default_delay if p95 is None else max(p95, self.min_delay)
+
+    async def _attempt(self, name, session, prompt, on_chunk, race=None):
+        started = time.monotonic()
+        first = True
+
+        async def forward(text):
+            nonlocal first
+            if first:
+                first = False
+                self.latency[name].observe(time.monotonic() - started)
+            if race and not race.claim(name):
+                raise _Superseded()
+            await on_chunk(text)
+
+        breaker = self.breakers[name]
+        try:
+            reply = await call_chat(session, prompt, forward if on_chunk else None)
+        except _Superseded:
+            raise
+        except asyncio.CancelledError:
+            # Cancelled because the other model won: not the model's fault. Otherwise it is the
+            # dispatcher's timeout, which counts as a failure.
+            if not (race and race.lost(name)):
+                breaker.failure()
+            raise
+        except Exception:
+            breaker.failure()
+            raise
+        breaker.success()
+        if on_chunk is None:
+            self.latency[name].observe(time.monotonic() - started)
+        return reply
+
+    async def _on_fallback(self, history, chat, prompt, on_chunk):
+        # The fallback session starts from the primary's history and hands its turn back to it
+        session = self._get_model(self.fallback).start_chat(history=history)
+        reply = await self._attempt(self.fallback, session, prompt, on_chunk)
+        chat.history = session.history
+        return reply
+
+    async def send(self, chat, prompt, on_chunk=None):
+        history = list(chat.history)
+        if not self.breakers[self.primary].allow():
+            if self.breakers[self.fallback].allow():
+                return await self._on_fallback(history, chat, prompt, on_chunk)
+            # Both degraded: the primary is still the best bet
+            return await self._attempt(self.primary, chat, prompt, on_chunk)
+
+        race = _Race()
+        primary = race.tasks[self.primary] = asyncio.create_task(
+            self._attempt(self.primary, chat, prompt, on_chunk, race)
+        )
+        try:
+            done, _ = await asyncio.wait([primary], timeout=self.hedge_delay())
+            if done and primary.exception() is not None and self.breakers[self.fallback].allow():
+                logging.warning(f"Gemini {self.labels[self.primary]} failed ({primary.exception()}), retrying on {self.labels[self.fallback]}")
+                return await self._on_fallback(history, chat, prompt, on_chunk)
+            if done or race.winner is not None or not self.breakers[self.fallback].allow():
+                return await primary
+
+            logging.info(f"🏁 Gemini {self.labels[self.primary]} slow to answer, hedging on {self.labels[self.fallback]}")
+            session = self._get_model(self.fallback).start_chat(history=history)
+            race.tasks[self.fallback] = asyncio.create_task(
+                self._attempt(self.fallback, session, prompt, on_chunk, race)
+            )
+
+            errors = []
+            pending = set(race.tasks.values())
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = next(n for n, t in race.tasks.items() if t is task)
+                    if task.cancelled() or isinstance(task.exception(), _Superseded):
+                        continue
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        continue
+                    if race.claim(name):
+                        hedges.inc(winner=self.labels[name])
+                        if name == self.fallback:
+                            chat.history = session.history
+                        return task.result()
+            raise errors[0]
+        finally:
+            for task in race.tasks.values():
+                task.cancel()
+
+    def stats(self):
+        return {
+            self.labels[name]: {"p95": self.p95(name), "circuit_open": self.breakers[name].is_open}
+            for name in (self.primary, self.fallback)
+        }
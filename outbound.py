@@ -0,0 +1,223 @@
+import os
+import time
+import asyncio
+from collections import Counter, deque
+import metrics
+
+
+# Priorités des envois (plus petit = plus urgent)
+SCHEDULED = 0  # check-in / check-out reminders
+ADMIN = 1      # DM forwards, status messages
+CHAT = 2       # replies to learners
+BULK = 3       # birthday DMs, announcements
+
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "8"))
+# Discord: 50 requêtes/s au total, ~5 messages / 5 s par salon
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "40"))
+OUTBOUND_ROUTE_BURST = int(os.getenv("OUTBOUND_ROUTE_BURST", "5"))
+OUTBOUND_ROUTE_WINDOW = float(os.getenv("OUTBOUND_ROUTE_WINDOW", "5"))
+# Au-delà de cette profondeur de file, les éditions intermédiaires (droppable) sont abandonnées
+OUTBOUND_SHED_DEPTH = int(os.getenv("OUTBOUND_SHED_DEPTH", "100"))
+
+send_latency = metrics.histogram("discord_send_seconds", "Duration of Discord send/edit/reply calls.")
+queue_wait = metrics.histogram("outbound_queue_wait_seconds", "Time spent by a job in the outbound queue.")
+
+
+class RateLimiter:
+    # Token bucket
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RouteBucket:
+    # Sliding window of the last sends on one route (channel or DM)
+    def __init__(self, burst, window):
+        self.burst = burst
+        self.window = window
+        self._sent = deque()
+
+    def _expire(self, now):
+        while self._sent and self._sent[0] <= now - self.window:
+            self._sent.popleft()
+
+    def delay(self):
+        now = time.monotonic()
+        self._expire(now)
+        if len(self._sent) < self.burst:
+            return 0.0
+        return self._sent[0] + self.window - now
+
+    def available(self):
+        # Sends still allowed in the current window
+        self._expire(time.monotonic())
+        return self.burst - len(self._sent)
+
+    def record(self):
+        self._sent.append(time.monotonic())
+
+
+class OutboundJob:
+    def __init__(self, priority, route, factory, coalesce_key=None, droppable=False):
+        self.priority = priority
+        self.route = route
+        self.factory = factory
+        self.coalesce_key = coalesce_key
+        self.droppable = droppable
+        self.future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.monotonic()
+
+
+class OutboundDispatcher:
+    # Every Discord send/edit/reply goes through this priority queue.
+    # - scheduled reminders go before admin forwards, chat replies and bulk DMs
+    # - per-route buckets are tracked locally, so a job whose channel is exhausted is parked until
+    #   its bucket refills (without blocking the other routes) instead of hitting a 429
+    # - pending edits of the same message are coalesced: only the latest content is sent
+    # - when the queue is deeper than shed_depth, droppable jobs (intermediate edits) are dropped
+
+    def __init__(self, workers=OUTBOUND_WORKERS, global_rate=OUTBOUND_GLOBAL_RATE,
+                 route_burst=OUTBOUND_ROUTE_BURST, route_window=OUTBOUND_ROUTE_WINDOW,
+                 shed_depth=OUTBOUND_SHED_DEPTH):
+        self.workers = workers
+        self.route_burst = route_burst
+        self.route_window = route_window
+        self.shed_depth = shed_depth
+        self._global = RateLimiter(global_rate)
+        self._buckets = {}
+        self._queue = None
+        self._tasks = []
+        self._seq = 0
+        self._coalescing = {}  # coalesce_key -> pending job
+        self._parked = {}      # route -> deque of jobs waiting for the route bucket, in order
+        self._route_jobs = Counter()  # route -> jobs queued or parked
+        self._depth = {SCHEDULED: 0, ADMIN: 0, CHAT: 0, BULK: 0}
+        self._waits = deque(maxlen=1000)  # (priority, seconds waited)
+        self.shed = 0
+        self.coalesced = 0
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _put(self, job):
+        self._seq += 1
+        self._queue.put_nowait((job.priority, self._seq, job))
+
+    async def submit(self, priority, route, factory, coalesce_key=None, droppable=False):
+        # factory() -> awaitable doing the actual Discord call; returns its result
+        # (None if the job was coalesced into a newer one or shed)
+        self._ensure_started()
+        if droppable and self._queue.qsize() >= self.shed_depth:
+            self.shed += 1
+            return None
+        if coalesce_key is not None and coalesce_key in self._coalescing:
+            job = self._coalescing[coalesce_key]
+            job.factory = factory
+            job.droppable = job.droppable and droppable
+            previous, job.future = job.future, asyncio.get_running_loop().create_future()
+            if not previous.done():
+                previous.set_result(None)
+            self.coalesced += 1
+            return await job.future
+        job = OutboundJob(priority, route, factory, coalesce_key, droppable)
+        if coalesce_key is not None:
+            self._coalescing[coalesce_key] = job
+        self._depth[priority] += 1
+        self._route_jobs[route] += 1
+        self._put(job)
+        return await job.future
+
+    async def send(self, target, content, priority=CHAT):
+        # target: channel, user or member (anything with .send)
+        return await self.submit(priority, target.id, lambda: target.send(content))
+
+    async def reply(self, message, content, priority=CHAT):
+        return await self.submit(priority, message.channel.id, lambda: message.reply(content))
+
+    async def edit(self, message, content, priority=CHAT, droppable=False):
+        return await self.submit(
+            priority, message.channel.id, lambda: message.edit(content=content),
+            coalesce_key=("edit", message.id), droppable=droppable,
+        )
+
+    def has_room(self, route):
+        # True when a new job on this route would go out right away (its bucket is not spoken for by
+        # queued jobs); optional messages such as streaming placeholders are skipped otherwise
+        return self._bucket(route).available() - self._route_jobs[route] > 0
+
+    def _release(self, route):
+        for job in self._parked.pop(route, ()):
+            self._put(job)
+
+    def _bucket(self, route):
+        if route not in self._buckets:
+            self._buckets[route] = RouteBucket(self.route_burst, self.route_window)
+        return self._buckets[route]
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            if job.route in self._parked:
+                self._parked[job.route].append(job)
+                continue
+            delay = self._bucket(job.route).delay()
+            if delay > 0:
+                # Route exhausted: park its jobs (in order) and keep serving the other routes
+                self._parked[job.route] = deque([job])
+                asyncio.get_running_loop().call_later(delay, self._release, job.route)
+                continue
+
+            if job.coalesce_key is not None:
+                self._coalescing.pop(job.coalesce_key, None)
+            self._depth[job.priority] -= 1
+            self._route_jobs[job.route] -= 1
+            if not self._route_jobs[job.route]:
+                del self._route_jobs[job.route]
+            if job.droppable and self._queue.qsize() >= self.shed_depth:
+                self.shed += 1
+                if not job.future.done():
+                    job.future.set_result(None)
+                continue
+
+            await self._global.acquire()
+            self._bucket(job.route).record()
+            wait = time.monotonic() - job.queued_at
+            self._waits.append((job.priority, wait))
+            queue_wait.observe(wait)
+            try:
+                with send_latency.time():
+                    result = await job.factory()
+            except Exception as e:
+                metrics.errors.inc(source="discord")
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def stats(self):
+        waits = sorted(wait for _, wait in self._waits)
+        return {
+            "depth": dict(self._depth),
+            "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+            "shed": self.shed,
+            "coalesced": self.coalesced,
+        }
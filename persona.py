@@ -0,0 +1,9 @@
+import hashlib
+
+
+def load_persona(filepath):
+    # Returns (prompt, version); the version is a short hash of the file so logs show which persona answered
+    with open(filepath, 'r', encoding='utf-8') as f:
+        prompt = f.read().strip()
+    version = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    return prompt, version
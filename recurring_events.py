@@ -0,0 +1,147 @@
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime
+import pytz
+import metrics
+from outbound import BULK
+
+
+events_sent = metrics.counter("recurring_events_sent_total", "Birthday and announcement messages sent, by outcome.")
+
+
+def _parse_when(value):
+    # "MM-DD" repeats every year, "YYYY-MM-DD" happens once
+    parts = value.split("-")
+    if len(parts) == 2:
+        return None, int(parts[0]), int(parts[1])
+    return int(parts[0]), int(parts[1]), int(parts[2])
+
+
+def _is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+class RecurringEvents:
+    # Yearly and one-off events (birthdays, announcements) indexed by (month, day),
+    # so finding the events of a day is one dict lookup whatever the number of events.
+    # Yearly events of February 29 fall on February 28 in other years.
+
+    def __init__(self, events, send_at="09:00", timezone="Europe/Brussels"):
+        self.send_at = send_at
+        self.timezone = pytz.timezone(timezone)
+        self._by_day = {}
+        for event in events:
+            year, month, day = _parse_when(event["date"])
+            self._by_day.setdefault((month, day), []).append({**event, "year": year})
+
+    def __len__(self):
+        return sum(len(events) for events in self._by_day.values())
+
+    def events_on(self, day):
+        keys = [(day.month, day.day)]
+        if day.month == 2 and day.day == 28 and not _is_leap(day.year):
+            keys.append((2, 29))
+        return [event for key in keys for event in self._by_day.get(key, ())
+                if event["year"] in (None, day.year)]
+
+
+def load_recurring_events(filepath):
+    # User and channel IDs can come from the environment (user_env / channel_env), like cohorts.json
+    with open(filepath, 'r') as f:
+        config = json.load(f)
+    events = []
+    for event in config["events"]:
+        if not event.get("enabled", True):
+            continue
+        event = dict(event)
+        if "user_env" in event:
+            event["user_id"] = os.getenv(event["user_env"])
+        if "channel_env" in event:
+            event["channel_id"] = os.getenv(event["channel_env"])
+        if event.get("type") != "birthday" and not event.get("message"):
+            logging.error(f"❌ Event {event.get('name', event['date'])} has no message, skipped.")
+            continue
+        target = event.get("user_id") or event.get("channel_id")
+        if not target:
+            logging.error(f"❌ No user or channel ID for event {event.get('name', event['date'])}, skipped.")
+            continue
+        for key in ("user_id", "channel_id"):
+            if event.get(key) is not None:
+                event[key] = int(event[key])
+        events.append(event)
+    return RecurringEvents(events, config.get("send_at", "09:00"), config.get("timezone", "Europe/Brussels"))
+
+
+class RecurringEventSender:
+    # Sends a day's events as one batch through the outbound dispatcher (BULK priority, so they are
+    # rate limited and never delay reminders or chat replies). Users and channels come from the
+    # gateway cache (bot.get_user, bot.get_channel) when possible; REST lookups (fetch_user,
+    # fetch_channel) are done once and kept. The leader may not host the guild of a channel: only
+    # the guilds of its own shards are cached.
+
+    def __init__(self, bot, outbound, events, state=None):
+        self.bot = bot
+        self.outbound = outbound
+        self.events = events
+        self.state = state  # anything with get_meta/set_meta, e.g. ChatHistoryDB
+        self._users = {}
+        self._channels = {}
+
+    async def resolve_user(self, user_id):
+        user = self.bot.get_user(user_id) or self._users.get(user_id)
+        if user is None:
+            user = await self.bot.fetch_user(user_id)
+            self._users[user_id] = user
+        return user
+
+    async def resolve_channel(self, channel_id):
+        channel = self.bot.get_channel(channel_id) or self._channels.get(channel_id)
+        if channel is None:
+            channel = await self.bot.fetch_channel(channel_id)
+            self._channels[channel_id] = channel
+        return channel
+
+    async def _send(self, event):
+        try:
+            if event.get("user_id") is not None:
+                target = await self.resolve_user(event["user_id"])
+                name = target.name
+            else:
+                target = await self.resolve_channel(event["channel_id"])
+                name = target.name
+            default = "🎉 Happy Birthday {name}! 🎂" if event.get("type") == "birthday" else ""
+            await self.outbound.send(target, event.get("message", default).format(name=name), BULK)
+        except Exception as e:
+            events_sent.inc(outcome="error")
+            metrics.errors.inc(source="recurring_events")
+            logging.error(f"❌ Could not send {event.get('type', 'event')} of {event['date']}: {e}")
+            return False
+        events_sent.inc(outcome="ok")
+        logging.info(f"🎉 Sent {event.get('type', 'event')} message to {name}")
+        return True
+
+    async def send_day(self, day):
+        due = self.events.events_on(day)
+        if not due:
+            return 0
+        results = await asyncio.gather(*(self._send(event) for event in due))
+        logging.info(f"📆 {sum(results)}/{len(due)} recurring events sent for {day.isoformat()}")
+        return sum(results)
+
+    def today(self):
+        return datetime.now(self.events.timezone).date()
+
+    def is_past_send_time(self):
+        now = datetime.now(self.events.timezone)
+        return now.strftime("%H:%M") >= self.events.send_at
+
+    async def run_today(self):
+        # Once per day, even across restarts: the last day sent is kept in the state store (chat_db meta)
+        day = self.today()
+        if self.state is not None:
+            if self.state.get_meta("recurring_events_sent") == day.isoformat():
+                return 0
+            self.state.set_meta("recurring_events_sent", day.isoformat())
+        return await self.send_day(day)
@@ -0,0 +1,271 @@
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import cProfile
+import logging
+import pstats
+import resource
+import tempfile
+import threading
+from collections import Counter
+
+import discord
+
+# Replays run in this process (the stubs are not shared with LLM workers) and are not recorded
+# again; both are read when the bot's modules are imported
+os.environ["LLM_WORKERS"] = "0"
+os.environ["TRAFFIC_RECORDING"] = "0"
+
+import benchmark
+from benchmark import FakeChannel, FakeMessage, FakeUser, format_ms, percentile
+from traffic_recorder import read_traces
+
+# Re-drives traces recorded with TRAFFIC_RECORDING=1 through main.on_message and
+# main.send_scheduled_message, with the fake Discord gateway, Gemini stub and fixture sheet of
+# benchmark.py. Messages are rebuilt from their recorded shape (length, code block, intent) and
+# each user's journal is pre-filled to the recorded history length, so the context window and the
+# summaries do the same work as in production.
+#
+#   python replay.py traces/traffic.jsonl                 # real time (long idle gaps shortened)
+#   python replay.py traces/traffic.jsonl --speed 20      # 20x faster
+#   python replay.py traces/traffic.jsonl --speed 0 --profile replay.prof
+#   python replay.py traces/traffic.jsonl --sample stacks.txt   # collapsed stacks for a flame graph
+
+FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore".split()
+INTENT_PROMPTS = {
+    "time": "what time is it?",
+    "next_event": "when is the next check-in?",
+    "moodle": "moodle link please",
+    "techtalk": "who is doing today's tech-talk?",
+}
+
+
+class FakeDMChannel(FakeChannel, discord.DMChannel):
+    # isinstance(channel, discord.DMChannel) is how main.on_message recognizes private messages
+    def __init__(self, gateway, channel_id, name):
+        self.gateway = gateway
+        self.id = channel_id
+        self.name = name
+        self.messages = 0
+
+
+def synthesize_prompt(event, tag):
+    # Same length and shape as the recorded message, none of its content
+    if event.get("intent") in INTENT_PROMPTS:
+        return f"<@0> {INTENT_PROMPTS[event['intent']]}"
+    words = [FILLER[i % len(FILLER)] for i in range(max(1, event.get("words", 1) - 2))]
+    text = " ".join(words)
+    text += "x" * max(0, event.get("chars", 0) - len(text) - len(tag) - 6)
+    if event.get("code"):
+        text = f"```\n{text}\n```"
+    return f"<@0> {text} {tag}" if event["kind"] == "mention" else text
+
+
+class StackSampler:
+    # Sampling profiler: every `interval` seconds, the main thread's stack is recorded.
+    # The output is in the "collapsed stacks" format read by flamegraph.pl and speedscope.
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Replayer:
+    def __init__(self, main, gateway, args):
+        self.main = main
+        self.gateway = gateway
+        self.args = args
+        self.users = {}
+        self.channels = {}
+        self.sent_at = {}        # "(qN)" tag -> time the mention was sent
+        self.latencies = {}      # kind -> [seconds]
+        self.counts = Counter()
+        self.tasks = []
+
+    def user(self, event):
+        # Anonymized user -> fake user, whose journal is pre-filled to the recorded history length
+        if event["user"] not in self.users:
+            user = FakeUser(30_000 + len(self.users), f"user{len(self.users)}")
+            self.users[event["user"]] = user
+            for i in range((event.get("history") or 0) // 2):
+                self.main.chat_db.append_turn(user.id, f"earlier question {i} " + " ".join(FILLER), "earlier answer " + " ".join(FILLER * 3))
+        return self.users[event["user"]]
+
+    def channel(self, event):
+        key = (event["channel"], event["kind"] == "dm")
+        if key not in self.channels:
+            channel_id = 6000 + len(self.channels)
+            if event["kind"] == "dm":
+                self.channels[key] = FakeDMChannel(self.gateway, channel_id, f"dm-{channel_id}")
+            else:
+                self.channels[key] = self.gateway.add_channel(channel_id, f"channel-{channel_id}")
+        return self.channels[key]
+
+    async def _timed(self, kind, coroutine):
+        started = time.perf_counter()
+        await coroutine
+        if kind:
+            self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+    def dispatch(self, event):
+        self.counts[event["kind"]] += 1
+        if event["kind"] == "scheduled":
+            coroutine, kind = self.main.send_scheduled_message(event["time"]), "scheduled"
+        else:
+            tag = f"(q{len(self.sent_at)})" if event["kind"] == "mention" and not event.get("intent") else ""
+            mentions = [self.gateway.user] if event["kind"] == "mention" else []
+            message = FakeMessage(self.user(event), self.channel(event), synthesize_prompt(event, tag), mentions)
+            if tag:
+                self.sent_at[tag] = time.perf_counter()
+            # Gemini mentions are timed until their answer is visible (see run), the rest until handled
+            kind = None if tag else "intent" if event.get("intent") else event["kind"]
+            coroutine = self.main.on_message(message)
+        self.tasks.append(asyncio.create_task(self._timed(kind, coroutine)))
+
+    async def run(self, events):
+        # The trace's own pace divided by --speed; idle gaps longer than --max-gap are cut short
+        started = time.perf_counter()
+        offset = 0.0
+        previous = events[0]["t"] if events else 0.0
+        for event in events:
+            offset += min(event["t"] - previous, self.args.max_gap)
+            previous = event["t"]
+            if self.args.speed > 0:
+                delay = started + offset / self.args.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.dispatch(event)
+        await asyncio.gather(*self.tasks)
+
+        deadline = time.perf_counter() + self.args.timeout
+        while len(self.gateway.answered) < len(self.sent_at) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        await self.main.dm_digest.flush()
+        self.latencies["mention"] = [self.gateway.answered[tag] - t for tag, t in self.sent_at.items() if tag in self.gateway.answered]
+        return time.perf_counter() - started, offset
+
+
+async def run(args, events):
+    workdir = tempfile.mkdtemp(prefix="discordbot-replay-")
+    try:
+        main = benchmark.load_bot(args, workdir)
+        gateway, gemini = benchmark.install_fakes(main, args)
+        import metrics
+        metrics.start(port=0)
+
+        replayer = Replayer(main, gateway, args)
+        profiler = cProfile.Profile() if args.profile else None
+        sampler = StackSampler(args.sample_interval) if args.sample else None
+        if profiler:
+            profiler.enable()
+        if sampler:
+            sampler.start()
+        try:
+            elapsed, trace_seconds = await replayer.run(events)
+        finally:
+            if profiler:
+                profiler.disable()
+            if sampler:
+                sampler.stop()
+
+        if profiler:
+            profiler.dump_stats(args.profile)
+        if sampler:
+            sampler.dump(args.sample)
+        main.chat_db.close()
+        return {
+            "events": dict(replayer.counts),
+            "users": len(replayer.users),
+            "mentions": len(replayer.sent_at),
+            "answered": len(replayer.latencies["mention"]),
+            "latency": {kind: {"p50": percentile(samples, 0.50), "p99": percentile(samples, 0.99), "count": len(samples)}
+                        for kind, samples in replayer.latencies.items()},
+            "trace_seconds": trace_seconds,
+            "elapsed": elapsed,
+            "gemini_calls": gemini.calls,
+            "discord_api_calls": gateway.api_calls,
+            "event_loop_lag_p99": metrics.loop_lag.quantile(0.99),
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(summary, args):
+    events = ", ".join(f"{count} {kind}" for kind, count in sorted(summary["events"].items()))
+    print(f"\nReplayed {events} from {summary['users']} users")
+    print(f"{summary['trace_seconds']:.0f} s of traffic in {summary['elapsed']:.1f} s")
+    print(f"\n{'kind':<10} {'count':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for kind, latency in sorted(summary["latency"].items()):
+        print(f"{kind:<10} {latency['count']:>7} {format_ms(latency['p50'])} {format_ms(latency['p99'])}")
+    print(f"\nGemini mentions answered: {summary['answered']}/{summary['mentions']}")
+    print(f"Gemini calls: {summary['gemini_calls']}, Discord API calls: {summary['discord_api_calls']}")
+    print(f"Event loop lag p99: {format_ms(summary['event_loop_lag_p99']).strip()} ms")
+    print(f"Peak RSS: {summary['peak_rss_mb']:.1f} MB")
+    if args.profile:
+        print(f"\ncProfile stats written to {args.profile}, top {args.profile_top} by cumulative time:")
+        pstats.Stats(args.profile).sort_stats("cumulative").print_stats(args.profile_top)
+    if args.sample:
+        print(f"Collapsed stacks written to {args.sample} (flamegraph.pl or speedscope)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded traffic against the bot with fake Discord, Gemini and Sheets.")
+    parser.add_argument("trace", help="trace file written with TRAFFIC_RECORDING=1 (its rotated files are read too)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor, 0 = as fast as possible")
+    parser.add_argument("--max-gap", type=float, default=60.0, help="longest idle gap of the trace kept (s)")
+    parser.add_argument("--channels", type=int, default=1, help="cohort channels the scheduled reminders go to")
+    parser.add_argument("--gemini-latency", type=float, default=1.5, help="mean Gemini answer time (s)")
+    parser.add_argument("--gemini-jitter", type=float, default=0.5)
+    parser.add_argument("--discord-latency", type=float, default=0.08, help="mean Discord API round trip (s)")
+    parser.add_argument("--sheets-latency", type=float, default=0.4, help="Google Sheets call time (s)")
+    parser.add_argument("--sheet-rows", type=int, default=200)
+    parser.add_argument("--coalesce-window", type=float, default=None, help="override MENTION_COALESCE_WINDOW")
+    parser.add_argument("--timeout", type=float, default=300, help="give up waiting for answers after (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--profile", metavar="FILE", help="run under cProfile and write the stats to FILE")
+    parser.add_argument("--profile-top", type=int, default=25, help="functions shown from the cProfile stats")
+    parser.add_argument("--sample", metavar="FILE", help="sample the main thread's stack and write collapsed stacks to FILE")
+    parser.add_argument("--sample-interval", type=float, default=0.005, help="seconds between stack samples")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    logging.basicConfig(level=logging.WARNING)
+    events = read_traces(args.trace)
+    if not events:
+        print(f"❌ No events in {args.trace}")
+        sys.exit(1)
+    summary = asyncio.run(run(args, events))
+    print_report(summary, args)
@@ -0,0 +1,86 @@
+import os
+import re
+import time
+from collections import OrderedDict
+
+
+# Cache des réponses Gemini (désactivé par défaut)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "500"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Un utilisateur qui a parlé au bot depuis moins de QUIET secondes est en pleine conversation : pas de cache
+RESPONSE_CACHE_QUIET_SECONDS = int(os.getenv("RESPONSE_CACHE_QUIET_SECONDS", str(30 * 60)))
+
+_MENTIONS = re.compile(r"<[@#][!&]?\d+>")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+# Questions that depend on who asks or on the previous messages are never cached
+_PERSONAL = re.compile(
+    r"\b(?:i|i'm|im|me|my|mine|myself|we|our|us|it|this|that|these|those|above|previous|again|today|tomorrow|yesterday)\b"
+)
+
+
+def normalize_prompt(prompt):
+    text = _MENTIONS.sub(" ", prompt).lower()
+    text = _PUNCTUATION.sub(" ", text.replace("'", ""))
+    return _SPACES.sub(" ", text).strip()
+
+
+def is_cacheable(prompt):
+    if "```" in prompt:
+        return False
+    text = _MENTIONS.sub(" ", prompt).lower()
+    return bool(normalize_prompt(prompt)) and not _PERSONAL.search(text)
+
+
+class ResponseCache:
+    # LRU + TTL cache of Gemini replies keyed on the normalized prompt.
+    # Only generic questions (see is_cacheable) from users who are not in the middle of a conversation
+    # are served from the cache; the caller journals the cached turn like any other (Conversations.remember).
+    # Replies put in the cache must not depend on the asker's history (Conversations.ask standalone=True).
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS, quiet_seconds=RESPONSE_CACHE_QUIET_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.quiet_seconds = quiet_seconds
+        self._entries = OrderedDict()  # key -> (reply, expires_at)
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def key_for(self, prompt, last_message_at=None):
+        # None when the prompt must go to Gemini uncached.
+        # last_message_at: time.time() of the user's last journaled message, if any; a question asked
+        # shortly after may refer to that conversation
+        recent = last_message_at is not None and time.time() - last_message_at < self.quiet_seconds
+        if recent or not is_cacheable(prompt):
+            self.bypassed += 1
+            return None
+        return normalize_prompt(prompt)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, reply):
+        self._entries[key] = (reply, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
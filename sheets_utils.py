@@ -1,62 +1,156 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import os
+import asyncio
+import logging
 from datetime import datetime
+import pytz
+import metrics
+
+# Fréquence de vérification de la feuille, et âge max du snapshot avant un rechargement complet (secondes)
+TECHTALK_POLL_SECONDS = int(os.getenv("TECHTALK_POLL_SECONDS", "300"))
+TECHTALK_TTL_SECONDS = int(os.getenv("TECHTALK_TTL_SECONDS", "3600"))
+
+SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+TIMEZONE = pytz.timezone('Europe/Brussels')
+
+fetch_latency = metrics.histogram("sheets_fetch_seconds", "Duration of tech-talk sheet checks and reloads.")
+
+
+def parse_sheet_date(value):
+    # Les dates de la feuille sont au format 5/3/25 (ou 5/3/2025)
+    value = str(value).strip()
+    for fmt in ('%d/%m/%y', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def format_techtalk_message(row):
+    return (
+        f"\n🎤 TECH-TALK ALERT 🎤\n"
+        f"Learner: {row.get('Learner') or 'N/A'}\n"
+        f"Theme: {row.get('Theme') or 'N/A'}\n"
+        f"Voice: {row.get('Voice') or 'N/A'}\n"
+        f"Slides: {row.get('Slides') or 'N/A'}\n"
+        f"Body Language: {row.get('Body Language') or 'N/A'}"
+    )
+
+
+def build_techtalk_index(values):
+    # values = sheet.get_all_values(); la 2ème ligne contient les en-têtes
+    if len(values) < 2:
+        return {}
+    headers = [h.strip() for h in values[1]]
+    if 'Date' not in headers:
+        logging.warning(f"No 'Date' column in tech-talk sheet headers: {headers}")
+        return {}
+
+    index = {}
+    for raw_row in values[2:]:
+        row = dict(zip(headers, raw_row))
+        day = parse_sheet_date(row.get('Date', ''))
+        if day is None:
+            continue
+        index.setdefault(day, []).append(format_techtalk_message(row))
+    return index
+
+
+class TechTalkIndex:
+    # Holds one authorized gspread client and an in-memory {date: [messages]} index of the whole sheet.
+    # Reads never touch the network; a background task re-downloads the sheet when it changes
+    # (Drive modifiedTime) or when the snapshot is older than the TTL. If Sheets is slow or down,
+    # the last good snapshot keeps being served.
+
+    def __init__(self, json_keyfile_path, sheet_url, poll_seconds=TECHTALK_POLL_SECONDS, ttl_seconds=TECHTALK_TTL_SECONDS):
+        self.json_keyfile_path = json_keyfile_path
+        self.sheet_url = sheet_url
+        self.poll_seconds = poll_seconds
+        self.ttl_seconds = ttl_seconds
+        self._spreadsheet = None
+        self._by_date = {}
+        self._modified_time = None
+        self.loaded_at = None
+        self._task = None
+
+    def _open(self):
+        if self._spreadsheet is None:
+            # Imported on the first refresh (in a thread) rather than at bot startup
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+            creds = ServiceAccountCredentials.from_json_keyfile_name(self.json_keyfile_path, SCOPE)
+            client = gspread.authorize(creds)
+            self._spreadsheet = client.open_by_url(self.sheet_url)
+        return self._spreadsheet
+
+    def _is_fresh(self, modified_time):
+        if self.loaded_at is None or modified_time is None:
+            return False
+        if (datetime.now(TIMEZONE) - self.loaded_at).total_seconds() >= self.ttl_seconds:
+            return False
+        return modified_time == self._modified_time
+
+    def refresh(self, force=False):
+        # Blocking: call it from a thread (see refresh_async)
+        try:
+            with fetch_latency.time():
+                spreadsheet = self._open()
+                try:
+                    modified_time = spreadsheet.get_lastUpdateTime()
+                except Exception as e:
+                    logging.warning(f"Could not read tech-talk sheet modifiedTime: {e}")
+                    modified_time = None
+                if not force and self._is_fresh(modified_time):
+                    return False
+                index = build_techtalk_index(spreadsheet.sheet1.get_all_values())
+        except Exception as e:
+            # Le client sera recréé au prochain essai, l'ancien snapshot reste servi
+            self._spreadsheet = None
+            metrics.errors.inc(source="sheets")
+            logging.error(f"❌ Tech-talk sheet refresh failed, serving stale snapshot: {e}")
+            return False
+
+        self._by_date = index
+        self._modified_time = modified_time
+        self.loaded_at = datetime.now(TIMEZONE)
+        logging.info(f"📥 Tech-talk index loaded ({sum(len(v) for v in index.values())} talks over {len(index)} days)")
+        return True
+
+    async def refresh_async(self, force=False):
+        return await asyncio.to_thread(self.refresh, force)
+
+    async def _refresh_forever(self):
+        while True:
+            await self.refresh_async()
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self):
+        # Safe to call on every on_ready: only one refresh task ever runs
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_forever())
+
+    def messages_for(self, day):
+        return "\n\n".join(self._by_date.get(day, []))
+
+    def today_message(self):
+        return self.messages_for(datetime.now(TIMEZONE).date())
+
+
+_indexes = {}
+
+def get_techtalk_index(json_keyfile_path, sheet_url):
+    key = (json_keyfile_path, sheet_url)
+    if key not in _indexes:
+        _indexes[key] = TechTalkIndex(json_keyfile_path, sheet_url)
+    return _indexes[key]
+
 
 def get_techtalk_message_if_today(json_keyfile_path, sheet_url):
-    # Autorisations Google Sheets
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    creds = ServiceAccountCredentials.from_json_keyfile_name(json_keyfile_path, scope)
-    client = gspread.authorize(creds)
-
-    # Ouverture de la feuille
-    sheet = client.open_by_url(sheet_url).sheet1
-    
-    # Afficher les en-têtes réelles pour identifier le problème
-    headers = sheet.row_values(2)  # Utiliser la 2ème ligne pour les en-têtes
-    print("Actual Headers in Sheet:", headers)  # Afficher les en-têtes réelles
-
-    # Identifier la position des colonnes spécifiques
-    date_idx = headers.index('Date') if 'Date' in headers else -1
-    learner_idx = headers.index('Learner') if 'Learner' in headers else -1
-    theme_idx = headers.index('Theme') if 'Theme' in headers else -1
-    feedback_idx = headers.index('Feedback_') if 'Feedback_' in headers else -1
-    
-    # Rechercher les colonnes sous Feedback_
-    voice_idx = headers.index('Voice') if 'Voice' in headers else -1
-    slides_idx = headers.index('Slides') if 'Slides' in headers else -1
-    body_lang_idx = headers.index('Body Language') if 'Body Language' in headers else -1
-
-    # Récupération des données sous forme de dictionnaires avec en-têtes spécifiées
-    records = sheet.get_all_records(head=2, expected_headers=headers)  # Passer les en-têtes attendus
-
-    # Date du jour au format attendu
-    today_str = datetime.today().strftime('%-d/%-m/%y')
-    print(f"Today's date: {today_str}")  # Pour déboguer
-
-    messages = []
-
-    for row in records:
-        # Accéder aux valeurs par index
-        date_value = str(row.get(headers[date_idx], "")).strip() if date_idx != -1 else ""
-        learner = row.get(headers[learner_idx], "N/A") if learner_idx != -1 else "N/A"
-        theme = row.get(headers[theme_idx], "N/A") if theme_idx != -1 else "N/A"
-        voice = row.get(headers[voice_idx], "N/A") if voice_idx != -1 else "N/A"
-        slides = row.get(headers[slides_idx], "N/A") if slides_idx != -1 else "N/A"
-        body_lang = row.get(headers[body_lang_idx], "N/A") if body_lang_idx != -1 else "N/A"
-        
-        # Vérifie si la date correspond à aujourd'hui
-        if date_value == today_str:
-            msg = (
-                f"\n🎤 TECH-TALK ALERT 🎤\n"
-                f"Learner: {learner}\n"
-                f"Theme: {theme}\n"
-                f"Voice: {voice}\n"
-                f"Slides: {slides}\n"
-                f"Body Language: {body_lang}"
-            )
-            messages.append(msg)
-    print(messages)
-    return "\n\n".join(messages) if messages else ""
+    # Kept for scripts: blocking, loads the index on first use then answers from memory
+    index = get_techtalk_index(json_keyfile_path, sheet_url)
+    if index.loaded_at is None:
+        index.refresh(force=True)
+    return index.today_message()
 
 
 if __name__ == "__main__":
@@ -68,4 +162,4 @@ if __name__ == "__main__":
         print("Tech Talk Message(s) for Today:")
         print(techtalk_message)
     else:
-        print("No tech talks scheduled for today.")
\ No newline at end of file
+        print("No tech talks scheduled for today.")
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The bot's modules live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# chat_history reads its default path at import time: keep the tests' databases out of the repository
+os.environ["CHAT_HISTORY_DB"] = os.path.join(tempfile.mkdtemp(prefix="discordbot-tests-"), "chat_history.db")
+os.environ["METRICS_PORT"] = "0"
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+from broadcast import BroadcastEngine
+from outbound import OutboundDispatcher
+from recurring_events import RecurringEvents, RecurringEventSender
+
+
+class Role:
+    def __init__(self, role_id, name):
+        self.name = name
+        self.mention = f"<@&{role_id}>"
+
+
+class Guild:
+    # A guild of another shard: not cached, so its roles list is empty until fetched
+    def __init__(self, roles):
+        self.roles = []
+        self._roles = roles
+
+    async def fetch_roles(self):
+        return self._roles
+
+
+class Channel:
+    def __init__(self, channel_id, name, guild=None):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.sent = []
+
+    async def send(self, content):
+        self.sent.append(content)
+
+
+class UncachedBot:
+    # The leader's gateway cache does not have the cohort's guild: only REST sees its channels
+    def __init__(self, channels):
+        self.channels = {channel.id: channel for channel in channels}
+        self.fetched = []
+
+    def get_channel(self, channel_id):
+        return None
+
+    async def fetch_channel(self, channel_id):
+        self.fetched.append(channel_id)
+        return self.channels[channel_id]
+
+
+def test_broadcast_reaches_a_channel_the_leader_has_not_cached():
+    channel = Channel(5000, "cohort-0", Guild([Role(1, "@everyone"), Role(42, "Cohort0")]))
+    bot = UncachedBot([channel])
+    engine = BroadcastEngine(bot, [{"name": "Cohort 0", "channel_id": 5000, "role_name": "Cohort0"}], OutboundDispatcher())
+
+    async def run():
+        await engine.broadcast(lambda cohort, role_mention: f"{role_mention} bip boup")
+        await engine.broadcast(lambda cohort, role_mention: f"{role_mention} bip boup again")
+
+    asyncio.run(run())
+    assert channel.sent == ["<@&42> bip boup", "<@&42> bip boup again"]
+    assert bot.fetched == [5000]  # resolved once, then cached
+
+
+def test_channel_events_reach_a_channel_the_leader_has_not_cached():
+    channel = Channel(7000, "general")
+    bot = UncachedBot([channel])
+    today = date.today()
+    events = RecurringEvents([{"date": today.strftime("%m-%d"), "channel_id": 7000, "message": "📢 Hello {name}"}],
+                             "09:00", "Europe/Brussels")
+    sender = RecurringEventSender(bot, OutboundDispatcher(), events)
+
+    assert asyncio.run(sender.send_day(today)) == 1
+    assert channel.sent == ["📢 Hello general"]
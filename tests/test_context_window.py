@@ -0,0 +1,60 @@
+import asyncio
+
+from chat_history import ChatHistoryDB
+from context_window import ContextManager
+from conversations import Conversations
+
+
+class Chat:
+    def __init__(self):
+        self.history = []
+
+
+def test_older_exchanges_are_folded_in_batches():
+    prompts = []
+
+    async def summarize(prompt):
+        prompts.append(prompt)
+        return f"summary {len(prompts)}"
+
+    manager = ContextManager(summarize, keep_turns=2, fold_turns=3)
+    chat = Chat()
+
+    async def run():
+        for turn in range(20):
+            manager.prepare(1, chat, f"question {turn}")
+            chat.history = chat.history + [{"role": "user", "parts": [f"question {turn}"]},
+                                           {"role": "model", "parts": [f"answer {turn}"]}]
+            await asyncio.sleep(0)  # background fold
+
+    asyncio.run(run())
+    # One summary call every 3 turns once the 2 kept verbatim are exceeded, not one per turn
+    assert [prompt.count("user: question") for prompt in prompts] == [3, 3, 3, 3, 3]
+    assert "question 12" in prompts[-1] and "question 14" in prompts[-1]
+    assert [m["parts"][0] for m in chat.history[1:4]] == ["Got it, I remember.", "question 15", "answer 15"]
+
+
+class StubChat:
+    def __init__(self, history):
+        self.history = list(history)
+
+
+class StubModel:
+    def start_chat(self, history=None):
+        return StubChat(history or [])
+
+
+def test_summaries_of_evicted_sessions_are_not_kept_in_memory(tmp_path):
+    conversations = Conversations(ChatHistoryDB(str(tmp_path / "chat.db")), lambda name: StubModel())
+    conversations.chats.max_sessions = 1
+    conversations.chat_db.save_summary(1, "Ada is learning Python", 10)
+    manager = conversations.context_manager
+
+    manager.prepare(1, conversations.chats.get(1))
+    assert manager._get_summary(1)[0] == "Ada is learning Python"
+    conversations.chats.get(2)  # user 1's session is evicted
+    assert 1 not in manager._summaries
+    # and read back from chat_db when the user returns
+    chat = conversations.chats.get(1)
+    manager.prepare(1, chat)
+    assert "Ada is learning Python" in chat.history[0]["parts"][0]
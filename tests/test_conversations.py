@@ -0,0 +1,122 @@
+import asyncio
+
+import google.generativeai as genai
+from google.generativeai import protos
+from google.generativeai.types.generation_types import AsyncGenerateContentResponse
+
+from chat_history import ChatHistoryDB
+from conversations import Conversations
+
+
+class StubModel(genai.GenerativeModel):
+    # A real GenerativeModel (so start_chat() gives a real ChatSession) whose API call is replaced
+    # by a stream of chunks, each one `delay` seconds after the previous one
+    def __init__(self, delay=0.0):
+        super().__init__("stub")
+        self.delay = delay
+        self.calls = 0
+        self.requests = []  # texts of the contents of each call
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        self.calls += 1
+        self.requests.append([part.text for content in contents for part in content.parts])
+        n = self.calls
+
+        async def chunks():
+            for i, text in enumerate((f"reply {n}", " continued")):
+                await asyncio.sleep(self.delay)
+                finish = protos.Candidate.FinishReason.STOP if i == 1 else protos.Candidate.FinishReason.FINISH_REASON_UNSPECIFIED
+                yield protos.GenerateContentResponse(candidates=[protos.Candidate(
+                    content=protos.Content(role="model", parts=[protos.Part(text=text)]), finish_reason=finish,
+                )])
+
+        if stream:
+            return await AsyncGenerateContentResponse.from_aiterator(chunks())
+        await asyncio.sleep(2 * self.delay)
+        return AsyncGenerateContentResponse.from_response(protos.GenerateContentResponse(candidates=[protos.Candidate(
+            content=protos.Content(role="model", parts=[protos.Part(text=f"reply {n} continued")]),
+            finish_reason=protos.Candidate.FinishReason.STOP,
+        )]))
+
+
+def make_conversations(tmp_path, model, timeout=5):
+    conversations = Conversations(ChatHistoryDB(str(tmp_path / "chat.db")), lambda name: model)
+    conversations.dispatcher.timeout = timeout
+    return conversations
+
+
+async def ignore(text):
+    pass
+
+
+def test_second_mention_while_first_reply_streams(tmp_path):
+    model = StubModel(delay=0.05)
+    conversations = make_conversations(tmp_path, model)
+
+    async def run():
+        first = asyncio.create_task(conversations.ask(1, "first question", on_chunk=ignore))
+        await asyncio.sleep(0.06)  # first chunk received, the stream is still open
+        second = await conversations.ask(1, "second question", on_chunk=ignore)
+        return await first, second
+
+    first, second = asyncio.run(run())
+    assert (first, second) == ("reply 1 continued", "reply 2 continued")
+    history = conversations.chats.get(1).history
+    assert [part.text for msg in history for part in msg.parts] == [
+        "first question", "reply 1 continued", "second question", "reply 2 continued",
+    ]
+
+
+def test_timeout_mid_stream_does_not_break_later_requests(tmp_path):
+    model = StubModel(delay=0.15)
+    conversations = make_conversations(tmp_path, model, timeout=0.2)
+
+    async def run():
+        await conversations.ask(1, "question", on_chunk=ignore)
+
+    try:
+        asyncio.run(run())
+        raise AssertionError("expected a timeout")
+    except asyncio.TimeoutError:
+        pass
+    assert 1 not in conversations.chats
+
+    conversations.dispatcher.timeout = 5
+    model.delay = 0.01
+    assert asyncio.run(conversations.ask(1, "again", on_chunk=ignore)) == "reply 2 continued"
+    assert asyncio.run(conversations.ask(1, "and again", on_chunk=ignore)) == "reply 3 continued"
+    # The timed-out turn was never journaled, so it is not in the rebuilt session either
+    assert conversations.chat_db.count(1) == 4
+
+
+def test_cancelled_stream_does_not_break_later_requests(tmp_path):
+    model = StubModel(delay=0.05)
+    conversations = make_conversations(tmp_path, model)
+
+    async def run():
+        task = asyncio.create_task(conversations.ask(1, "question", on_chunk=ignore))
+        await asyncio.sleep(0.07)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return await conversations.ask(1, "again", on_chunk=ignore)
+
+    assert asyncio.run(run()) == "reply 2 continued"
+
+
+def test_standalone_answer_does_not_see_the_users_history(tmp_path):
+    model = StubModel()
+    conversations = make_conversations(tmp_path, model)
+    conversations.chat_db.append_turn(1, "my name is Ada", "hi Ada")
+    conversations.chat_db.save_summary(1, "Ada is learning Python", 10)
+
+    async def run():
+        await conversations.ask(1, "earlier question")  # the session is resident
+        standalone = await conversations.ask(1, "What is a REST API?", standalone=True)
+        await conversations.ask(1, "follow-up")
+        return standalone
+
+    assert asyncio.run(run()) == "reply 2 continued"
+    # Nothing of the learner (journal, summary) went into the reply that can be served to others...
+    assert model.requests[1] == ["What is a REST API?"]
+    # ...but the turn is journaled, and the next request of the learner sees it
+    assert model.requests[2][-3:] == ["What is a REST API?", "reply 2 continued", "follow-up"]
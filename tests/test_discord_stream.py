@@ -0,0 +1,100 @@
+import asyncio
+
+from discord_stream import StreamingReply, split_message
+from outbound import OutboundDispatcher
+
+
+class Channel:
+    def __init__(self, delay=0.0):
+        self.id = 1
+        self.delay = delay
+        self.sent = []
+        self.created = 0
+
+    async def send(self, content):
+        await asyncio.sleep(self.delay)
+        self.sent.append(content)
+        return Message(self)
+
+
+class Message:
+    def __init__(self, channel):
+        self.id = channel.created
+        channel.created += 1
+        self.channel = channel
+
+    async def edit(self, content):
+        self.channel.sent.append(f"edit {self.id}: {content}")
+        return self
+
+
+def test_start_does_not_wait_for_the_placeholder():
+    async def run():
+        channel = Channel(delay=0.5)
+        reply = StreamingReply(channel, OutboundDispatcher(workers=1))
+        started = asyncio.get_running_loop().time()
+        await reply.start()
+        elapsed = asyncio.get_running_loop().time() - started
+        await reply.finish("answer")
+        return elapsed, channel.sent
+
+    elapsed, sent = asyncio.run(run())
+    assert elapsed < 0.1
+    assert sent == ["🤖 ...", "edit 0: answer"]
+
+
+def test_no_placeholder_nor_edits_when_the_channel_is_rate_limited():
+    async def run():
+        channel = Channel()
+        outbound = OutboundDispatcher(workers=1, route_burst=1, route_window=0.3)
+        await outbound.send(channel, "reminder")
+        reply = StreamingReply(channel, outbound, edit_interval=0)
+        await reply.start()
+        await reply.update("partial")
+        await reply.finish("answer")
+        return channel.sent
+
+    assert asyncio.run(run()) == ["reminder", "answer"]
+
+
+def test_final_render_edits_chunks_whose_intermediate_edit_was_shed():
+    long_reply = "a" * 1500 + "\n" + "b" * 1500
+
+    async def run():
+        channel = Channel()
+        # shed_depth=0: every droppable (intermediate) edit is shed
+        reply = StreamingReply(channel, OutboundDispatcher(workers=1, shed_depth=0), edit_interval=0)
+        await reply.start()
+        await reply.finish("🤖 ...")  # placeholder delivered
+        await reply.update(long_reply)
+        await reply._pending
+        await reply.finish(long_reply)
+        return channel.sent
+
+    sent = asyncio.run(run())
+    assert sent[-2:] in (["b" * 1500, "edit 0: " + "a" * 1500], ["edit 0: " + "a" * 1500, "b" * 1500])
+
+
+def test_split_message_keeps_the_next_line_indentation():
+    chunks = split_message("x" * 1990 + "\ndef f():\n        return 1")
+    assert chunks == ["x" * 1990, "def f():\n        return 1"]
+
+
+def test_split_message_closes_and_reopens_code_fences():
+    code = "\n".join(f"    print({i})" for i in range(300))
+    text = "Here you go:\n```python\n" + code + "\n```\nDone."
+    chunks = split_message(text)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 2000 for chunk in chunks)
+    for chunk in chunks:
+        # Every message renders on its own: its code blocks are balanced
+        assert sum(line.lstrip().startswith("```") for line in chunk.split("\n")) % 2 == 0
+    assert chunks[1].startswith("```python\n    print(")
+    # Nothing but the added fences (and the newline at each cut) is lost or changed
+    inner = [chunk.removeprefix("```python\n") if i else chunk for i, chunk in enumerate(chunks)]
+    inner = [chunk.removesuffix("\n```") if i < len(chunks) - 1 else chunk for i, chunk in enumerate(inner)]
+    assert "\n".join(inner) == text
+
+
+def test_split_message_short_text_is_untouched():
+    assert split_message("hello\n  world") == ["hello\n  world"]
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+import benchmark
+
+
+@pytest.fixture(scope="module")
+def intent_router(tmp_path_factory):
+    # main.py builds the router at import time, with offline stand-ins for its configuration
+    main = benchmark.load_bot(SimpleNamespace(coalesce_window=None), str(tmp_path_factory.mktemp("bot")))
+    return main.intent_router
+
+
+ANSWERED_LOCALLY = [
+    ("<@123> what time is it?", "time", {}),
+    ("hey bot, what's the time", "time", {}),
+    ("<@123> time", "time", {}),
+    ("when is the next check-in?", "next_event", {"check": "in"}),
+    ("<@123> when's the break", "next_event", {"other": "break"}),
+    ("how long until lunch?", "next_event", {"other": "lunch"}),
+    ("is it break time yet?", "next_event", {"other": "break"}),
+    ("next checkout please", "next_event", {"check": "out"}),
+    ("moodle link please", "moodle", {}),
+    ("can you give me the attendance link?", "moodle", {}),
+    ("where do I check in?", "moodle", {}),
+    ("who is doing today's tech-talk?", "techtalk", {}),
+    ("is there a tech talk today?", "techtalk", {}),
+]
+
+SENT_TO_GEMINI = [
+    "how do I get the current time in python?",
+    "what time complexity does quicksort have?",
+    "when do we break out of a loop?",
+    "where do I check out a git branch",
+    "what's the time difference between UTC and Brussels?",
+    "how long until the next check-in of my PR gets reviewed by CI?",
+    "is the moodle link in the course different from the check-in link?",
+    "why does my lunch break script crash?",
+    "how do I write a time function in JavaScript",
+    "can you explain today's tech-talk topic in more detail?",
+    "git checkout vs git switch?",
+    "what is time.sleep?",
+]
+
+
+@pytest.mark.parametrize("text,name,slots", ANSWERED_LOCALLY)
+def test_answered_locally(intent_router, text, name, slots):
+    found = intent_router.match(text)
+    assert found is not None and (found[0], found[2]) == (name, slots)
+
+
+@pytest.mark.parametrize("text", SENT_TO_GEMINI)
+def test_sent_to_gemini(intent_router, text):
+    assert intent_router.match(text) is None
+
+
+def test_benchmark_and_replay_questions_stay_local(intent_router):
+    import replay
+    for text in benchmark.INTENT_QUESTIONS + list(replay.INTENT_PROMPTS.values()):
+        assert intent_router.match(f"<@0> {text}") is not None, text
@@ -0,0 +1,38 @@
+import asyncio
+import sqlite3
+
+from leader import LeaderLease
+
+
+def test_lease_failover(tmp_path):
+    path = str(tmp_path / "lease.db")
+    first, second = LeaderLease(path, instance_id="a", ttl=0.3), LeaderLease(path, instance_id="b", ttl=0.3)
+    assert first.try_acquire() and not second.try_acquire()
+    first.release()
+    assert second.try_acquire() and second.holder == "b"
+
+
+def test_waiting_for_the_write_lock_does_not_block_the_event_loop(tmp_path):
+    path = str(tmp_path / "lease.db")
+    lease = LeaderLease(path, instance_id="a", ttl=3)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")  # another replica (or an LLM worker) writing
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        asyncio.get_running_loop().call_later(0.5, other.execute, "COMMIT")
+        acquired = await lease.acquire()
+        ticker.cancel()
+        return acquired, ticks
+
+    acquired, ticks = asyncio.run(run())
+    assert acquired
+    assert ticks >= 20
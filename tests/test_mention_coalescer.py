@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+
+from mention_coalescer import MentionCoalescer
+
+
+def message(user_id=1, channel_id=1):
+    return SimpleNamespace(author=SimpleNamespace(id=user_id), channel=SimpleNamespace(id=channel_id))
+
+
+def test_on_first_runs_right_away_and_handle_once_per_burst():
+    events = []
+
+    async def on_first(msg):
+        events.append(("first", asyncio.get_running_loop().time()))
+        return "placeholder"
+
+    async def handle(msg, prompt, started):
+        events.append(("handle", prompt, started))
+
+    async def run():
+        coalescer = MentionCoalescer(handle, window=0.2, max_wait=1, on_first=on_first)
+        started = asyncio.get_running_loop().time()
+        await coalescer.submit(message(), "first")
+        await coalescer.submit(message(), "second")
+        await asyncio.sleep(0.4)
+        return started
+
+    started = asyncio.run(run())
+    assert events[0][0] == "first" and events[0][1] - started < 0.05
+    assert events[1:] == [("handle", "first\nsecond", "placeholder")]
+
+
+def test_window_zero_calls_handle_right_away():
+    calls = []
+
+    async def handle(msg, prompt, started):
+        calls.append((prompt, started))
+
+    asyncio.run(MentionCoalescer(handle, window=0).submit(message(), "hello"))
+    assert calls == [("hello", None)]
@@ -0,0 +1,79 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+from chat_history import ChatHistoryDB
+from conversations import Conversations
+from response_cache import ResponseCache
+
+import benchmark
+
+
+class StubChat:
+    def __init__(self, history):
+        self.history = list(history)
+
+
+class StubModel:
+    def start_chat(self, history=None):
+        return StubChat(history or [])
+
+
+def test_generic_question_is_cached_for_a_new_user():
+    cache = ResponseCache()
+    assert cache.key_for("What is a REST API?") == "what is a rest api"
+    assert cache.key_for("What is a REST API?", last_message_at=time.time() - 3600) == "what is a rest api"
+
+
+def test_users_in_a_conversation_bypass_the_cache():
+    cache = ResponseCache(quiet_seconds=600)
+    assert cache.key_for("What is a REST API?", last_message_at=time.time() - 60) is None
+    assert cache.key_for("Can you explain that more?") is None
+
+
+def test_cached_turns_are_journaled_and_reach_the_session(tmp_path):
+    conversations = Conversations(ChatHistoryDB(str(tmp_path / "chat.db")), lambda name: StubModel())
+    assert conversations.chats.get(1).history == []
+
+    conversations.remember(1, "What is a REST API?", "An API over HTTP.")
+
+    assert conversations.chat_db.last_message_at(1) is not None
+    assert [m["parts"][0] for m in conversations.chats.get(1).history] == ["What is a REST API?", "An API over HTTP."]
+
+
+class RecordingConversations:
+    def __init__(self):
+        self.asked = []
+
+    async def ask(self, user_id, prompt, on_chunk=None, standalone=False):
+        self.asked.append((prompt, standalone))
+        return f"answer to {prompt}"
+
+
+class Reply:
+    async def update(self, text):
+        pass
+
+    async def finish(self, text):
+        self.text = text
+
+
+def test_only_standalone_answers_are_cached(tmp_path, monkeypatch):
+    main = benchmark.load_bot(SimpleNamespace(coalesce_window=None), str(tmp_path))
+    conversations = RecordingConversations()
+    monkeypatch.setattr(main, "conversations", conversations)
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    monkeypatch.setattr(main, "RESPONSE_CACHE_ENABLED", True)
+    # A learner with a history, quiet for a while: the cache may be used...
+    main.chat_db.append_turn(77, "my name is Ada", "hi Ada")
+    monkeypatch.setattr(main.chat_db, "last_message_at", lambda user_id: time.time() - 3600)
+    message = SimpleNamespace(author=SimpleNamespace(id=77))
+
+    async def run():
+        await main.answer_with_gemini(message, "What is a REST API?", reply_stream=Reply())
+        await main.answer_with_gemini(message, "Can you explain that more?", reply_stream=Reply())
+
+    asyncio.run(run())
+    # ...but the reply it gets must not come from their history; personal questions use the session
+    assert conversations.asked == [("What is a REST API?", True), ("Can you explain that more?", False)]
+    assert main.response_cache.get("what is a rest api") == "answer to What is a REST API?"
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+import benchmark
+
+
+def test_on_ready_setup_survives_a_failing_status_message_and_is_retried(tmp_path, monkeypatch):
+    args = SimpleNamespace(coalesce_window=None, discord_latency=0.0, gemini_latency=0.01, gemini_jitter=0.0,
+                           sheet_rows=10, sheets_latency=0.0, channels=1)
+    main = benchmark.load_bot(args, str(tmp_path))
+    benchmark.install_fakes(main, args)
+    syncs = []
+
+    async def forbidden(*args, **kwargs):
+        raise RuntimeError("403 Forbidden")
+
+    async def flaky_sync():
+        syncs.append(1)
+        if len(syncs) == 1:
+            raise RuntimeError("503 Service Unavailable")
+
+    monkeypatch.setattr(main.outbound, "send", forbidden)
+    monkeypatch.setattr(main, "sync_commands_if_changed", flaky_sync)
+    monkeypatch.setattr(main.bot, "get_channel", lambda channel_id: SimpleNamespace(id=channel_id))
+
+    async def run():
+        try:
+            # The status message fails in the background, the command sync fails the first setup...
+            try:
+                await main.on_ready()
+            except RuntimeError:
+                pass
+            assert not main.startup_done
+            # ...and the next on_ready (reconnect) finishes it
+            await main.on_ready()
+            await asyncio.sleep(0.05)
+            return main.startup_done, main.scheduler.running, {job.id for job in main.scheduler.get_jobs()}
+        finally:
+            if main.scheduler.running:
+                main.scheduler.shutdown(wait=False)
+            main.leader_lease.release()
+            main.startup_done = False
+
+    done, running, jobs = asyncio.run(run())
+    assert done and running and len(syncs) == 2
+    assert {f"message_{t}" for t in main.daily_schedule.times()} | {"recurring_events"} <= jobs
+
+
+def test_buffered_private_messages_are_forwarded_on_shutdown(tmp_path, monkeypatch):
+    main = benchmark.load_bot(SimpleNamespace(coalesce_window=None), str(tmp_path))
+    sent, closed = [], []
+
+    async def send(target, content, priority=None):
+        sent.append(content)
+
+    async def close_connection():
+        closed.append(len(sent))
+
+    monkeypatch.setattr(main.outbound, "send", send)
+    monkeypatch.setattr(main, "close_connection", close_connection)
+    monkeypatch.setattr(main.dm_digest, "window", 3600)
+    monkeypatch.setattr(main.bot, "get_channel", lambda channel_id: SimpleNamespace(id=channel_id))
+
+    async def run():
+        main.dm_digest.add("learner#1", "can you check my PR?")
+        await main.shutdown_bot()
+
+    asyncio.run(run())
+    assert len(sent) == 1 and "can you check my PR?" in sent[0]
+    assert closed == [1]  # forwarded before the connection closed
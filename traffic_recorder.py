@@ -0,0 +1,78 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import logging
+import logging.handlers
+
+
+# Enregistrement (opt-in) de la forme du trafic, pour le rejouer avec replay.py
+TRAFFIC_RECORDING = os.getenv("TRAFFIC_RECORDING", "0") == "1"
+TRAFFIC_FILE = os.getenv("TRAFFIC_FILE", "traces/traffic.jsonl")
+TRAFFIC_MAX_BYTES = int(os.getenv("TRAFFIC_MAX_BYTES", str(10 * 1024 * 1024)))
+TRAFFIC_BACKUPS = int(os.getenv("TRAFFIC_BACKUPS", "5"))
+# Sans sel fixe, les identifiants anonymisés changent à chaque démarrage
+TRAFFIC_SALT = os.getenv("TRAFFIC_SALT") or os.urandom(16).hex()
+
+
+class TrafficRecorder:
+    # Writes one compact JSON line per incoming message and scheduled job, to a rotating file.
+    # Nothing identifying is kept: user and channel IDs are replaced by salted hashes and message
+    # text by its shape (length, words, code block, matched intent, stored history length).
+
+    def __init__(self, path=TRAFFIC_FILE, enabled=TRAFFIC_RECORDING, max_bytes=TRAFFIC_MAX_BYTES,
+                 backups=TRAFFIC_BACKUPS, salt=TRAFFIC_SALT):
+        self.enabled = enabled
+        self.path = path
+        self._salt = salt.encode()
+        self._logger = None
+        if enabled:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger("traffic")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(handler)
+            logging.info(f"🎙️ Recording anonymized traffic to {path}")
+
+    def anonymize(self, value):
+        return hmac.new(self._salt, str(value).encode(), hashlib.sha256).hexdigest()[:12]
+
+    def _write(self, event):
+        self._logger.info(json.dumps({"t": round(time.time(), 3), **event}, separators=(",", ":")))
+
+    def message(self, message, kind, intent=None, history=None):
+        # kind: "dm", "mention" or "message"
+        if not self.enabled:
+            return
+        content = message.content or ""
+        self._write({
+            "kind": kind,
+            "user": self.anonymize(message.author.id),
+            "channel": self.anonymize(message.channel.id),
+            "chars": len(content),
+            "words": len(content.split()),
+            "code": "```" in content,
+            "intent": intent,
+            "history": history,
+        })
+
+    def scheduled(self, time_str, event_types):
+        if not self.enabled:
+            return
+        self._write({"kind": "scheduled", "time": time_str, "types": list(event_types)})
+
+
+def read_traces(path):
+    # Events of path and its rotated files (path.N ... path.1, then path), oldest first
+    files = [f"{path}.{i}" for i in range(TRAFFIC_BACKUPS + 50, 0, -1) if os.path.exists(f"{path}.{i}")]
+    if os.path.exists(path):
+        files.append(path)
+    events = []
+    for filename in files:
+        with open(filename, "r", encoding="utf-8") as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+    events.sort(key=lambda event: event["t"])
+    return events